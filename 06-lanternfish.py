@@ -75,6 +75,7 @@ Find a way to simulate lanternfish. How many lanternfish would there be after 80
 
 import unittest
 from collections import deque
+from functools import lru_cache
 from helper_functions import read_txt_file_contents
 
 
@@ -94,19 +95,103 @@ def lanternfish_growth(input_data, number_of_days):
     return sum(fish_population)
 
 
-def populate_deque(input_data):
+def populate_deque(input_data, number_of_slots=9):
     """
     Create a deque of the fish where each index is the current time til birth
     and the value is the amount of fish at that value
     """
     if isinstance(input_data, str):
         input_data = [int(number) for number in input_data.split(",")]
-    fish_population = deque([0]*9)
+    fish_population = deque([0]*number_of_slots)
     for i in input_data:
         fish_population[i] += 1
     return fish_population
 
 
+@lru_cache(maxsize=None)
+def growth_recurrence(cycle_length=7, maturity_length=2):
+    """
+    Coefficients of the linear recurrence the population follows for a
+    species that gives birth every cycle_length days, where a newborn needs
+    maturity_length extra days before its first cycle.
+    With L = cycle_length + maturity_length timer slots the transition matrix
+    has characteristic polynomial x^L - x^maturity_length - 1, so
+    population(n + L) = population(n + maturity_length) + population(n)
+    Returns the tuple (r_0, ..., r_L-1) where x^L = sum(r_i * x^i)
+    """
+    if cycle_length < 1 or maturity_length < 0:
+        raise ValueError("cycle_length must be >= 1 and maturity_length >= 0")
+    recurrence = [0] * (cycle_length + maturity_length)
+    recurrence[0] += 1
+    recurrence[maturity_length] += 1
+    return tuple(recurrence)
+
+
+def multiply_mod_recurrence(poly_a, poly_b, recurrence):
+    """
+    Multiply two polynomials (lists of coefficients, lowest power first)
+    and reduce the product using x^L = sum(r_i * x^i)
+    """
+    order = len(recurrence)
+    product = [0] * (2 * order - 1)
+    for i, a in enumerate(poly_a):
+        if a:
+            for j, b in enumerate(poly_b):
+                product[i + j] += a * b
+    for power in range(len(product) - 1, order - 1, -1):
+        coefficient = product[power]
+        if coefficient:
+            product[power] = 0
+            for i, r in enumerate(recurrence):
+                if r:
+                    product[power - order + i] += coefficient * r
+    return product[:order]
+
+
+def x_power_mod_recurrence(exponent, recurrence):
+    """
+    Calculate x^exponent reduced by the recurrence (Kitamasa's method) using
+    exponentiation by squaring, so takes O(L^2 log(exponent))
+    """
+    order = len(recurrence)
+    result = [1] + [0] * (order - 1)
+    base = [0] * order
+    if order == 1:
+        base[0] = recurrence[0]
+    else:
+        base[1] = 1
+    while exponent:
+        if exponent & 1:
+            result = multiply_mod_recurrence(result, base, recurrence)
+        base = multiply_mod_recurrence(base, base, recurrence)
+        exponent >>= 1
+    return result
+
+
+def generalised_lanternfish_growth(input_data, number_of_days,
+                                   cycle_length=7, maturity_length=2):
+    """
+    Population after number_of_days for a species with the given cycle and
+    maturity lengths.
+    Simulate the first L days to get the initial terms of the recurrence,
+    then population(n) = sum(c_i * population(i)) where c is x^n reduced by
+    the cached recurrence
+    """
+    recurrence = growth_recurrence(cycle_length, maturity_length)
+    order = len(recurrence)
+    fish_population = populate_deque(input_data, order)
+    initial_terms = []
+    for _ in range(min(order, number_of_days + 1)):
+        initial_terms.append(sum(fish_population))
+        births = fish_population.popleft()
+        fish_population.append(births)
+        fish_population[cycle_length - 1] += births
+    if number_of_days < order:
+        return initial_terms[number_of_days]
+    coefficients = x_power_mod_recurrence(number_of_days, recurrence)
+    return sum(c * term for c, term in zip(coefficients, initial_terms))
+
+
 """
 --- Part Two ---
 Suppose the lanternfish live forever and have unlimited food and space. Would
@@ -173,6 +258,39 @@ class TestLanternfishGrowth(unittest.TestCase):
                 self.assertEqual(actual, expected_result)
 
 
+class TestGeneralisedLanternfishGrowth(unittest.TestCase):
+
+    def test_matches_lanternfish_growth(self):
+        for number_of_days in [0, 1, 8, 9, 18, 80, 256]:
+            with self.subTest(f"days - {number_of_days}"):
+                actual = generalised_lanternfish_growth('3, 4, 3, 1, 2', number_of_days)
+                expected = lanternfish_growth('3, 4, 3, 1, 2', number_of_days)
+                self.assertEqual(actual, expected)
+
+    def test_other_species(self):
+        for cycle_length, maturity_length in [(1, 0), (3, 0), (5, 4), (2, 7)]:
+            order = cycle_length + maturity_length
+            fish_population = populate_deque([0, order - 1], order)
+            for number_of_days in range(40):
+                with self.subTest(f"{cycle_length}, {maturity_length} - {number_of_days}"):
+                    actual = generalised_lanternfish_growth(
+                        [0, order - 1], number_of_days, cycle_length, maturity_length)
+                    self.assertEqual(actual, sum(fish_population))
+                births = fish_population.popleft()
+                fish_population.append(births)
+                fish_population[cycle_length - 1] += births
+
+    def test_huge_horizon(self):
+        actual = generalised_lanternfish_growth('3, 4, 3, 1, 2', 10**5)
+        self.assertEqual(actual, lanternfish_growth('3, 4, 3, 1, 2', 10**5))
+
+    def test_growth_recurrence(self):
+        self.assertEqual(growth_recurrence(), (1, 0, 1, 0, 0, 0, 0, 0, 0))
+        self.assertEqual(growth_recurrence(3, 0), (2, 0, 0))
+        with self.assertRaises(ValueError):
+            growth_recurrence(0, 2)
+
+
 if __name__ == "__main__":
     starting_fish_pop = read_txt_file_contents("06-lanternfish_growth_rate.txt")[0]
     print(lanternfish_growth(starting_fish_pop, 80))
@@ -52,6 +52,9 @@ fuel possible. How much fuel must they spend to align to that position?
 """
 
 import unittest
+import numpy
+from collections import Counter
+from itertools import accumulate
 from statistics import mode
 from statistics import mean, median
 
@@ -117,6 +120,123 @@ def calculate_total_distance_from_each_node_to_point(input_data, node):
     return sum(extra_fuel_usage)
 
 
+def crab_position_histogram(input_data):
+    """
+    Count the crabs at each position from the minimum to the maximum
+    position. Returns the minimum position and the list of counts
+    """
+    if isinstance(input_data, str):
+        input_data = [int(num) for num in input_data.split(",")]
+    position_counts = Counter(input_data)
+    min_position = min(position_counts)
+    histogram = [0] * (max(position_counts) - min_position + 1)
+    for position, count in position_counts.items():
+        histogram[position - min_position] = count
+    return min_position, histogram
+
+
+def crab_fuel_curves(input_data):
+    """
+    Calculate the part 1 (linear) and part 2 (triangular) fuel cost of
+    aligning at every position between the min and max crab positions.
+    Uses prefix sums of the histogram counts and of position * count, so is
+    O(n + range) rather than O(n * range).
+    For a point p:
+        linear = p*N_left - S_left + S_right - p*N_right
+        sum of squares = Q - 2*p*S + p^2*N
+        triangular = (sum of squares + linear) / 2
+    Returns the min position and the two lists of fuel costs
+    """
+    min_position, histogram = crab_position_histogram(input_data)
+    positions = range(min_position, min_position + len(histogram))
+    count_prefix = list(accumulate(histogram))
+    position_prefix = list(accumulate(pos * count for pos, count in zip(positions, histogram)))
+    total_count = count_prefix[-1]
+    total_position = position_prefix[-1]
+    total_square = sum(pos * pos * count for pos, count in zip(positions, histogram))
+
+    linear_costs = []
+    triangular_costs = []
+    for pos, count_left, position_left in zip(positions, count_prefix, position_prefix):
+        linear = (pos * count_left - position_left
+                  + (total_position - position_left) - pos * (total_count - count_left))
+        square = total_square - 2 * pos * total_position + pos * pos * total_count
+        linear_costs.append(linear)
+        triangular_costs.append((square + linear) // 2)
+    return min_position, linear_costs, triangular_costs
+
+
+def optimal_crab_alignment(input_data, part_2=False):
+    """
+    Exact position and fuel that minimises the part 1 or part 2 fuel cost
+    """
+    min_position, linear_costs, triangular_costs = crab_fuel_curves(input_data)
+    fuel_costs = triangular_costs if part_2 else linear_costs
+    best_index = min(range(len(fuel_costs)), key=fuel_costs.__getitem__)
+    return min_position + best_index, fuel_costs[best_index]
+
+
+class FuelModel:
+    """
+    A fuel model given by the fuel cost for a crab to move a distance.
+    cost_per_distance should take a numpy array of distances and return the
+    array of costs (a closed form). If it only works on a single int pass
+    vectorised=False and it is wrapped with numpy.vectorize.
+    Models that are convex in the distance can be minimised with a ternary
+    search, anything else falls back to scanning every position
+    """
+
+    def __init__(self, cost_per_distance, convex=True, vectorised=True):
+        if not vectorised:
+            cost_per_distance = numpy.vectorize(cost_per_distance, otypes=[numpy.int64])
+        self.cost_per_distance = cost_per_distance
+        self.convex = convex
+
+    def total_fuel(self, positions, counts, point):
+        """
+        Total fuel to move every crab to point, where positions and counts
+        are the histogram of the crab positions
+        """
+        distances = numpy.abs(positions - point)
+        return int((self.cost_per_distance(distances) * counts).sum())
+
+
+LINEAR_FUEL = FuelModel(lambda distance: distance)
+TRIANGULAR_FUEL = FuelModel(lambda distance: distance * (distance + 1) // 2)
+
+
+def minimise_crab_fuel(input_data, fuel_model):
+    """
+    Position and fuel that minimises the total fuel for the fuel model.
+    The crab positions are reduced to a histogram so each evaluation is a
+    vectorised sum over the distinct positions.
+    Convex models use an integer ternary search over [min, max], other
+    models evaluate every position in the range
+    """
+    min_position, histogram = crab_position_histogram(input_data)
+    counts = numpy.array(histogram, dtype=numpy.int64)
+    positions = numpy.flatnonzero(counts) + min_position
+    counts = counts[counts > 0]
+
+    def fuel(point):
+        return fuel_model.total_fuel(positions, counts, point)
+
+    low, high = min_position, min_position + len(histogram) - 1
+    if fuel_model.convex:
+        while high - low > 2:
+            third = (high - low) // 3
+            mid_low, mid_high = low + third, high - third
+            fuel_low, fuel_high = fuel(mid_low), fuel(mid_high)
+            if fuel_low < fuel_high:
+                high = mid_high - 1
+            elif fuel_low > fuel_high:
+                low = mid_low + 1
+            else:
+                low, high = mid_low, mid_high
+    return min(((point, fuel(point)) for point in range(low, high + 1)),
+               key=lambda point_fuel: point_fuel[1])
+
+
 class TestMinimumCrabFuelPart2(unittest.TestCase):
 
     @classmethod
@@ -133,6 +253,66 @@ class TestMinimumCrabFuelPart2(unittest.TestCase):
                 self.assertEqual(actual, expected_result)
 
 
+class TestOptimalCrabAlignment(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.test_case = [16, 1, 2, 0, 4, 2, 7, 1, 2, 14]
+
+    def test_optimal_crab_alignment(self):
+        self.assertEqual(optimal_crab_alignment(self.test_case), (2, 37))
+        self.assertEqual(optimal_crab_alignment(self.test_case, part_2=True), (5, 168))
+        self.assertEqual(optimal_crab_alignment("16,1,2,0,4,2,7,1,2,14", part_2=True), (5, 168))
+
+    def test_crab_fuel_curves(self):
+        min_position, linear_costs, triangular_costs = crab_fuel_curves(self.test_case)
+        self.assertEqual(min_position, 0)
+        self.assertEqual(len(linear_costs), 17)
+        for pos in range(17):
+            with self.subTest(f"position - {pos}"):
+                self.assertEqual(linear_costs[pos], sum(abs(num - pos) for num in self.test_case))
+                self.assertEqual(triangular_costs[pos],
+                                 calculate_total_distance_from_each_node_to_point(self.test_case, pos))
+
+    def test_single_crab(self):
+        self.assertEqual(optimal_crab_alignment([7]), (7, 0))
+        self.assertEqual(optimal_crab_alignment([7, 7], part_2=True), (7, 0))
+
+
+class TestMinimiseCrabFuel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.test_case = [16, 1, 2, 0, 4, 2, 7, 1, 2, 14]
+
+    def test_builtin_models(self):
+        self.assertEqual(minimise_crab_fuel(self.test_case, LINEAR_FUEL), (2, 37))
+        self.assertEqual(minimise_crab_fuel(self.test_case, TRIANGULAR_FUEL), (5, 168))
+
+    def test_scalar_cost_function(self):
+        quadratic_fuel = FuelModel(lambda distance: distance ** 2, vectorised=False)
+        self.assertEqual(minimise_crab_fuel(self.test_case, quadratic_fuel),
+                         min(((point, sum((num - point) ** 2 for num in self.test_case))
+                              for point in range(17)), key=lambda point_fuel: point_fuel[1]))
+
+    def test_non_convex_model(self):
+        # Moving an odd distance costs more than moving one further
+        parity_fuel = FuelModel(lambda distance: distance + 10 * (distance % 2), convex=False)
+        expected = min(((point, sum(abs(num - point) + 10 * (abs(num - point) % 2)
+                                    for num in self.test_case))
+                        for point in range(17)), key=lambda point_fuel: point_fuel[1])
+        self.assertEqual(minimise_crab_fuel(self.test_case, parity_fuel), expected)
+
+    def test_matches_fuel_curves(self):
+        test_case = [3, 3, 50, 21, 8, 99, 0, 64, 64, 13]
+        min_position, linear_costs, triangular_costs = crab_fuel_curves(test_case)
+        for fuel_model, fuel_costs in [(LINEAR_FUEL, linear_costs), (TRIANGULAR_FUEL, triangular_costs)]:
+            with self.subTest(f"fuel costs - {fuel_costs[:3]}"):
+                position, fuel = minimise_crab_fuel(test_case, fuel_model)
+                self.assertEqual(fuel, min(fuel_costs))
+                self.assertEqual(fuel, fuel_costs[position - min_position])
+
+
 if __name__ == "__main__":
     crab_positions = read_txt_file_contents("07-crab_positions.txt")[0]
     print(minimum_crab_fuel(crab_positions))
@@ -106,8 +106,11 @@ unique number of segments (highlighted above).
 
 """
 from collections import Counter
+from functools import lru_cache
+from itertools import permutations
 
 from helper_functions import read_txt_file_contents
+import numpy
 import unittest
 import re
 
@@ -274,6 +277,133 @@ def display_wiring_alternate_part_2(input_data):
     return sum(decoded_outputs)
 
 
+SEGMENT_PATTERNS = ["abcefg", "cf", "acdeg", "acdfg", "bcdf", "abdfg", "abdefg", "acf", "abcdefg", "abcdfg"]
+
+
+def segment_mask(word):
+    """
+    Encode a pattern as a 7 bit mask, a -> bit 0 ... g -> bit 6
+    """
+    mask = 0
+    for letter in word:
+        mask |= 1 << (ord(letter) - 97)
+    return mask
+
+
+@lru_cache(maxsize=None)
+def wiring_permutation_table():
+    """
+    Build the lookup for all 5040 ways the wires can be crossed.
+    For each permutation the 10 digit masks are sorted to give a signature
+    (as bytes) that only depends on the scrambled patterns, not their order.
+    Returns the dict signature -> permutation index, and a (5040, 128) array
+    of mask -> digit for each permutation (255 for masks that aren't digits)
+    """
+    signature_to_index = {}
+    digit_lookup = numpy.full((5040, 128), 255, dtype=numpy.uint8)
+    for index, wiring in enumerate(permutations("abcdefg")):
+        wire_map = str.maketrans("abcdefg", "".join(wiring))
+        masks = [segment_mask(pattern.translate(wire_map)) for pattern in SEGMENT_PATTERNS]
+        signature_to_index[bytes(sorted(masks))] = index
+        digit_lookup[index, masks] = range(10)
+    return signature_to_index, digit_lookup
+
+
+def decode_display_line(line):
+    """
+    Decode the 4 digit output of a single line with the permutation table
+    """
+    signature_to_index, digit_lookup = wiring_permutation_table()
+    masks = [segment_mask(word) for word in re.findall(r'(\w+)', line)]
+    digit_map = digit_lookup[signature_to_index[bytes(sorted(masks[:10]))]]
+    output = 0
+    for mask in masks[10:]:
+        output = output * 10 + int(digit_map[mask])
+    return output
+
+
+def display_masks(input_data):
+    """
+    Convert every word in the input to its segment mask in one pass over the
+    raw bytes. Returns a (lines, 14) uint8 array
+    """
+    if not isinstance(input_data, str):
+        input_data = "\n".join(input_data)
+    raw_bytes = numpy.frombuffer(input_data.encode(), dtype=numpy.uint8)
+    is_letter = (raw_bytes >= ord("a")) & (raw_bytes <= ord("g"))
+    word_starts = is_letter & ~numpy.concatenate(([False], is_letter[:-1]))
+    word_ids = numpy.cumsum(word_starts) - 1
+    masks = numpy.zeros(int(word_starts.sum()), dtype=numpy.uint8)
+    letter_bits = numpy.left_shift(1, raw_bytes[is_letter] - ord("a")).astype(numpy.uint8)
+    numpy.bitwise_or.at(masks, word_ids[is_letter], letter_bits)
+    return masks.reshape(-1, 14)
+
+
+def decode_displays_bitmask(input_data):
+    """
+    Decode every line of the input. The masks are sorted per line to look up
+    the wiring permutation, then the output digits are gathered from the
+    permutation table all at once. Returns the int array of output values
+    """
+    signature_to_index, digit_lookup = wiring_permutation_table()
+    masks = display_masks(input_data)
+    signatures = numpy.sort(masks[:, :10], axis=1)
+    permutation_index = numpy.fromiter(
+        (signature_to_index[signature.tobytes()] for signature in signatures),
+        dtype=numpy.intp, count=len(signatures)
+    )
+    digits = digit_lookup[permutation_index[:, None], masks[:, 10:]].astype(numpy.int64)
+    return digits @ numpy.array([1000, 100, 10, 1])
+
+
+def display_wiring_bitmask_part_2(input_data):
+    return int(decode_displays_bitmask(input_data).sum())
+
+
+def decode_displays_segment_frequency(input_data):
+    """
+    Batch version of display_wiring_alternate_part_2 that works on the raw
+    bytes of the whole file.
+    Letters before the | are counted into a (lines, 7) matrix, then each
+    output word's value is the sum of its letters' counts, which is mapped
+    to its digit through a 50 entry lookup array.
+    Returns the int array of output values, one per line
+    """
+    if not isinstance(input_data, str):
+        input_data = "".join(line.rstrip("\n") + "\n" for line in input_data if line.strip())
+    raw_bytes = numpy.frombuffer(input_data.encode(), dtype=numpy.uint8)
+    is_letter = (raw_bytes >= ord("a")) & (raw_bytes <= ord("g"))
+    is_newline = raw_bytes == ord("\n")
+    pipes_seen = numpy.cumsum(raw_bytes == ord("|"))
+    pipes_at_line_start = numpy.maximum.accumulate(numpy.where(is_newline, pipes_seen, 0))
+    after_pipe = pipes_seen > pipes_at_line_start
+
+    line_ids = (pipes_seen - after_pipe)[is_letter]
+    letters = (raw_bytes[is_letter] - ord("a")).astype(numpy.intp)
+    is_output = after_pipe[is_letter]
+    number_of_lines = int(pipes_seen[-1])
+    segment_counts = numpy.bincount(
+        line_ids[~is_output] * 7 + letters[~is_output], minlength=number_of_lines * 7
+    ).reshape(number_of_lines, 7)
+
+    output_word_starts = (is_letter & ~numpy.concatenate(([False], is_letter[:-1])) & after_pipe)[is_letter]
+    output_word_ids = numpy.cumsum(output_word_starts)[is_output] - 1
+    word_values = numpy.bincount(
+        output_word_ids,
+        weights=segment_counts[line_ids[is_output], letters[is_output]],
+        minlength=number_of_lines * 4
+    ).astype(numpy.intp)
+
+    digit_lookup = numpy.full(50, -1, dtype=numpy.int64)
+    digit_lookup[[42, 17, 34, 39, 30, 37, 41, 25, 49, 45]] = range(10)
+    digits = digit_lookup[word_values].reshape(number_of_lines, 4)
+    return digits @ numpy.array([1000, 100, 10, 1])
+
+
+def display_wiring_segment_frequency_part_2(input_data):
+    return int(decode_displays_segment_frequency(input_data).sum())
+
+
 class TestDisplayWiring(unittest.TestCase):
 
     @classmethod
@@ -373,6 +503,8 @@ class TestDisplayWiringPart2(unittest.TestCase):
         cls.functions_to_test = [
             display_wiring_part_2,
             display_wiring_alternate_part_2,
+            display_wiring_bitmask_part_2,
+            display_wiring_segment_frequency_part_2,
         ]
 
     def test_display_wiring(self):
@@ -383,6 +515,52 @@ class TestDisplayWiringPart2(unittest.TestCase):
                     self.assertEqual(actual, expected_result)
 
 
+class TestBitmaskDecoder(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.test_cases = [
+            ("acedgfb cdfbe gcdfa fbcad dab cefabd cdfgeb eafb cagedb ab | cdfeb fcadb cdfeb cdbaf", 5353),
+            ("abcefg cf acdeg acdfg bcdf abdfg abdefg acf abcdefg abcdfg | abcefg abcefg abcefg fc\n", 1),
+            ("be cfbegad cbdgef fgaecd cgeb fdcge agebfd fecdb fabcd edb | fdgacbe cefdb cefbgd gcbe", 8394),
+        ]
+
+    def test_segment_mask(self):
+        self.assertEqual(segment_mask("a"), 1)
+        self.assertEqual(segment_mask("gfedcba"), 127)
+        self.assertEqual(segment_mask("cf"), segment_mask("fc"))
+
+    def test_wiring_permutation_table(self):
+        signature_to_index, digit_lookup = wiring_permutation_table()
+        self.assertEqual(len(signature_to_index), 5040)
+        self.assertEqual(digit_lookup.shape, (5040, 128))
+        self.assertTrue(((digit_lookup != 255).sum(axis=1) == 10).all())
+
+    def test_decode_display_line(self):
+        for test_case, expected_result in self.test_cases:
+            with self.subTest(f"test case - {test_case}"):
+                self.assertEqual(decode_display_line(test_case), expected_result)
+
+    def test_decode_displays_bitmask(self):
+        lines = [test_case for test_case, _ in self.test_cases]
+        actual = decode_displays_bitmask(lines)
+        self.assertEqual(actual.tolist(), [expected for _, expected in self.test_cases])
+
+
+class TestSegmentFrequencyDecoder(unittest.TestCase):
+
+    def test_decode_displays_segment_frequency(self):
+        test_cases = [
+            ("acedgfb cdfbe gcdfa fbcad dab cefabd cdfgeb eafb cagedb ab | cdfeb fcadb cdfeb cdbaf\n", 5353),
+            ("abcefg cf acdeg acdfg bcdf abdfg abdefg acf abcdefg abcdfg | abcefg abcefg abcefg fc\n", 1),
+            ("be cfbegad cbdgef fgaecd cgeb fdcge agebfd fecdb fabcd edb | fdgacbe cefdb cefbgd gcbe", 8394),
+        ]
+        lines = [test_case for test_case, _ in test_cases]
+        expected = [expected_result for _, expected_result in test_cases]
+        self.assertEqual(decode_displays_segment_frequency(lines).tolist(), expected)
+        self.assertEqual(decode_displays_segment_frequency("".join(lines)).tolist(), expected)
+
+
 if __name__ == "__main__":
     wiring_info = read_txt_file_contents("08-display_wiring.txt")
     """
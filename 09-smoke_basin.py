@@ -40,18 +40,37 @@ levels of all low points on your heightmap?
 
 """
 
+import os
+import tempfile
 import unittest
 import numpy
 from collections import deque
+from pathlib import Path
 from helper_functions import read_txt_file_contents
 
 
+def low_point_mask(height_array, top_pad=1, bottom_pad=1):
+    """
+    Boolean array of the low points. Pad the edges with 10 (higher than
+    any height) and compare every node against its four shifted
+    neighbours at once. top_pad / bottom_pad are 0 when the first / last
+    row is a halo row from a neighbouring band, which is only compared
+    against and so has no entry in the mask
+    """
+    padded = numpy.pad(height_array, ((top_pad, bottom_pad), (1, 1)), constant_values=10)
+    centre = padded[1:-1, 1:-1]
+    return (
+        (centre < padded[:-2, 1:-1]) & (centre < padded[2:, 1:-1])
+        & (centre < padded[1:-1, :-2]) & (centre < padded[1:-1, 2:])
+    )
+
+
 class SmokeMap:
 
     def __init__(self, input_data):
         self.height_dict = {(i, j): num for i, row in enumerate(input_data) for j, num in enumerate(row) if num != '\n'}
         self.height_map = numpy.array([[int(num) for num in row if num != "\n"] for row in input_data])
-        self.low_points = []
+        self.low_point_grid = None
 
     @property
     def width(self):
@@ -63,15 +82,22 @@ class SmokeMap:
 
     @property
     def risk_level(self):
-        low_values = [self.height_map[i][j] + 1 for i, j in self.low_points]
-        return sum(low_values)
+        if self.low_point_grid is None:
+            return 0
+        return int((self.height_map[self.low_point_grid] + 1).sum())
+
+    @property
+    def low_points(self):
+        if self.low_point_grid is None:
+            return []
+        return [tuple(point) for point in numpy.argwhere(self.low_point_grid).tolist()]
+
+    @property
+    def low_point_mask(self):
+        return low_point_mask(self.height_map)
 
     def get_low_points(self):
-        for y_coord in range(self.depth):
-            for x_coord in range(self.width):
-                if self.check_low_point(y_coord, x_coord):
-                    self.low_points.append((y_coord, x_coord))
-                    # self.risk_level += self.height_map[y_coord][x_coord] + 1
+        self.low_point_grid = self.low_point_mask
 
     def check_low_point(self, y_coord, x_coord):
         x_low = max(x_coord - 1, 0)
@@ -109,14 +135,158 @@ class SmokeMap:
         i, j = node
         return {(i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)}
 
+    def get_basin_sizes(self):
+        """
+        Sizes of every basin, from one connected component labelling pass
+        over the whole map
+        """
+        labels = label_basins(self.height_map)
+        basin_sizes = numpy.bincount(labels[labels >= 0])
+        return basin_sizes[basin_sizes > 0]
+
+    def get_largest_basins(self):
+        basin_sizes = self.get_basin_sizes()
+        three_largest_basins = numpy.partition(basin_sizes, -3)[-3:]
+        return int(numpy.prod(three_largest_basins))
+
+
+def label_basins(height_map):
+    """
+    Label the connected areas of nodes that aren't 9 using an array backed
+    union-find over the flattened map.
+    Every pair of adjacent open nodes is an edge. Each round hooks the larger
+    root of every edge under the smaller root, then pointer jumps until every
+    node points straight at its root. Stops when every edge joins two nodes
+    with the same root.
+    Returns an array the same shape as height_map where each open node holds
+    the flat index of its basin's root (the smallest index in the basin),
+    and 9s are -1
+    """
+    is_open = numpy.asarray(height_map) != 9
+    depth, width = is_open.shape
+    node_ids = numpy.arange(depth * width).reshape(depth, width)
+    horizontal = is_open[:, :-1] & is_open[:, 1:]
+    vertical = is_open[:-1, :] & is_open[1:, :]
+    edge_start = numpy.concatenate((node_ids[:, :-1][horizontal], node_ids[:-1, :][vertical]))
+    edge_end = numpy.concatenate((node_ids[:, 1:][horizontal], node_ids[1:, :][vertical]))
+
+    parent = numpy.arange(depth * width)
+    while True:
+        root_start, root_end = parent[edge_start], parent[edge_end]
+        unjoined = root_start != root_end
+        if not unjoined.any():
+            break
+        low_root = numpy.minimum(root_start[unjoined], root_end[unjoined])
+        high_root = numpy.maximum(root_start[unjoined], root_end[unjoined])
+        numpy.minimum.at(parent, high_root, low_root)
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+    return numpy.where(is_open, parent.reshape(depth, width), -1)
+
+
+class TiledSmokeMap:
+    """
+    SmokeMap for height files too large to hold in memory. The file is
+    memory mapped and processed in bands of band_rows rows, so only a band
+    (plus a row either side for the low points) is ever loaded.
+    Basins are labelled per band, components that touch a band seam are
+    merged with a small union-find, and every other basin is finished as
+    soon as its band is done, keeping just the largest sizes
+    """
+
+    def __init__(self, filename, band_rows=1024):
+        self.filename = Path.cwd()/filename
+        self.band_rows = band_rows
+        with open(self.filename, "rb") as f:
+            first_line = f.readline()
+        self.width = len(first_line.rstrip(b"\r\n"))
+        self.row_stride = len(first_line)
+        self.heights = numpy.memmap(self.filename, dtype=numpy.uint8, mode="r")
+        self.depth = -(-len(self.heights) // self.row_stride)
+
+    def read_rows(self, start, end):
+        """
+        Heights for rows start to end as an int array
+        """
+        start, end = max(start, 0), min(end, self.depth)
+        raw_rows = numpy.array(self.heights[start * self.row_stride: end * self.row_stride])
+        missing_newline = -len(raw_rows) % self.row_stride
+        raw_rows = numpy.concatenate((raw_rows, numpy.zeros(missing_newline, dtype=numpy.uint8)))
+        return raw_rows.reshape(-1, self.row_stride)[:, :self.width].astype(numpy.int64) - ord("0")
+
+    def bands(self):
+        for start in range(0, self.depth, self.band_rows):
+            yield start, min(start + self.band_rows, self.depth)
+
+    @property
+    def risk_level(self):
+        risk_level = 0
+        for start, end in self.bands():
+            rows = self.read_rows(start - 1, end + 1)
+            top_pad, bottom_pad = int(start == 0), int(end == self.depth)
+            centre = rows[1 - top_pad: len(rows) - 1 + bottom_pad]
+            risk_level += int((centre[low_point_mask(rows, top_pad, bottom_pad)] + 1).sum())
+        return risk_level
+
+    def get_basin_sizes(self, number_of_basins=3):
+        """
+        Sizes of the number_of_basins largest basins, largest first.
+        carried_sizes holds the running size of every basin that touches the
+        last row of the previous band, keyed by its label, and
+        previous_last_row the labels of that row
+        """
+        largest_sizes = numpy.zeros(0, dtype=numpy.int64)
+        carried_sizes = {}
+        previous_last_row = numpy.full(self.width, -1)
+
+        def keep_largest(sizes):
+            sizes = numpy.concatenate((largest_sizes, numpy.asarray(sizes, dtype=numpy.int64)))
+            if len(sizes) > number_of_basins:
+                sizes = numpy.partition(sizes, -number_of_basins)[-number_of_basins:]
+            return sizes
+
+        for start, end in self.bands():
+            labels = label_basins(self.read_rows(start, end))
+            labels = numpy.where(labels >= 0, labels + start * self.width, -1)
+            band_labels, band_sizes = numpy.unique(labels[labels >= 0], return_counts=True)
+            seam_labels = numpy.union1d(labels[0][labels[0] >= 0], labels[-1][labels[-1] >= 0])
+            on_seam = numpy.isin(band_labels, seam_labels)
+            largest_sizes = keep_largest(band_sizes[~on_seam])
+
+            parent = {}
+
+            def find(label):
+                while parent.get(label, label) != label:
+                    label = parent[label]
+                return label
+
+            joined = (previous_last_row >= 0) & (labels[0] >= 0)
+            for carried_label, band_label in set(zip(previous_last_row[joined].tolist(),
+                                                     labels[0][joined].tolist())):
+                root_a, root_b = find(carried_label), find(band_label)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+            merged_sizes = {}
+            for label, size in list(carried_sizes.items()) + list(zip(band_labels[on_seam].tolist(),
+                                                                     band_sizes[on_seam].tolist())):
+                root = find(label)
+                merged_sizes[root] = merged_sizes.get(root, 0) + size
+
+            last_row_labels = numpy.unique(labels[-1][labels[-1] >= 0]).tolist()
+            last_row_roots = {label: find(label) for label in last_row_labels}
+            carried_sizes = {root: merged_sizes.pop(root) for root in set(last_row_roots.values())}
+            largest_sizes = keep_largest(list(merged_sizes.values()))
+            previous_last_row = numpy.array([last_row_roots.get(label, -1) for label in labels[-1].tolist()])
+
+        largest_sizes = keep_largest(list(carried_sizes.values()))
+        return sorted(largest_sizes.tolist(), reverse=True)
+
     def get_largest_basins(self):
-        if not self.low_points:
-            self.get_low_points()
-        basin_sizes = []
-        for low_point in self.low_points:
-            basin_sizes.append(self.get_basin_size(low_point))
-        three_largest_basins = sorted(basin_sizes, reverse=True)[:3]
-        return three_largest_basins[0] * three_largest_basins[1] * three_largest_basins[2]
+        return int(numpy.prod(self.get_basin_sizes(3)))
 
 
 class TestRiskLevels(unittest.TestCase):
@@ -230,6 +400,14 @@ class TestRiskLevels(unittest.TestCase):
                 actual = smoke_map.risk_level
                 self.assertEqual(actual, expected_result)
 
+    def test_low_points_before_and_after(self):
+        smoke_map = SmokeMap(["2199943210\n", "3987894921\n", "9856789892\n", "8767896789\n", "9899965678"])
+        self.assertEqual(smoke_map.risk_level, 0)
+        self.assertEqual(smoke_map.low_points, [])
+        smoke_map.get_low_points()
+        self.assertEqual(smoke_map.low_points, [(0, 1), (0, 9), (2, 2), (4, 6)])
+        self.assertEqual(smoke_map.risk_level, 15)
+
     def test_check_low_point(self):
         for grid, coords, expected_result in self.low_point_test_cases:
             with self.subTest():
@@ -237,6 +415,14 @@ class TestRiskLevels(unittest.TestCase):
                 actual = smoke.check_low_point(*coords)
                 self.assertEqual(actual, expected_result)
 
+    def test_low_point_mask(self):
+        for grid, _ in self.test_cases:
+            with self.subTest():
+                smoke = SmokeMap(grid)
+                actual = smoke.low_point_mask
+                expected = [[smoke.check_low_point(i, j) for j in range(smoke.width)] for i in range(smoke.depth)]
+                self.assertEqual(actual.tolist(), expected)
+
     def test_get_basin_size(self):
         for grid, coords, expected_result in self.neighbours_test_cases:
             with self.subTest():
@@ -244,6 +430,23 @@ class TestRiskLevels(unittest.TestCase):
                 actual = smoke.get_basin_size(coords)
                 self.assertEqual(actual, expected_result)
 
+    def test_get_basin_sizes(self):
+        grid = ["2199943210", "3987894921", "9856789892", "8767896789", "9899965678"]
+        actual = SmokeMap(grid).get_basin_sizes()
+        self.assertEqual(sorted(actual.tolist()), [3, 9, 9, 14])
+
+    def test_label_basins(self):
+        grid = ["2199943210", "3987894921", "9856789892", "8767896789", "9899965678"]
+        smoke = SmokeMap(grid)
+        labels = label_basins(smoke.height_map)
+        self.assertEqual(labels[0, 0], 0)
+        self.assertEqual(labels[0, 2], -1)
+        self.assertEqual(labels[4, 9], labels[4, 5])
+        for node, basin_size in [((0, 1), 3), ((0, 9), 9), ((2, 2), 14), ((4, 6), 9)]:
+            with self.subTest(f"node - {node}"):
+                self.assertEqual((labels == labels[node]).sum(), basin_size)
+                self.assertEqual(smoke.get_basin_size(node), basin_size)
+
     def test_get_largest_basins(self):
         for grid, expected_result in self.largest_basins_test_cases:
             with self.subTest():
@@ -251,6 +454,37 @@ class TestRiskLevels(unittest.TestCase):
                 actual = smoke.get_largest_basins()
                 self.assertEqual(actual, expected_result)
 
+class TestTiledSmokeMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        rng = numpy.random.default_rng(9)
+        random_grid = rng.choice(10, size=(57, 43), p=[0.08] * 9 + [0.28])
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.random_file = os.path.join(cls.temp_dir.name, "random_height_map.txt")
+        with open(cls.random_file, "w") as f:
+            f.write("\n".join("".join(str(num) for num in row) for row in random_grid) + "\n")
+        cls.test_cases = ["09-height_map.txt", cls.random_file]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.temp_dir.cleanup()
+
+    def test_matches_in_memory(self):
+        for filename in self.test_cases:
+            smoke_map = SmokeMap(read_txt_file_contents(filename))
+            smoke_map.get_low_points()
+            expected_sizes = sorted(smoke_map.get_basin_sizes().tolist(), reverse=True)[:5]
+            for band_rows in [1, 2, 3, 7, 64, 1000]:
+                with self.subTest(f"{filename} - {band_rows}"):
+                    tiled_map = TiledSmokeMap(filename, band_rows)
+                    self.assertEqual(tiled_map.depth, smoke_map.depth)
+                    self.assertEqual(tiled_map.width, smoke_map.width)
+                    self.assertEqual(tiled_map.risk_level, smoke_map.risk_level)
+                    self.assertEqual(tiled_map.get_basin_sizes(5), expected_sizes)
+                    self.assertEqual(tiled_map.get_largest_basins(), smoke_map.get_largest_basins())
+
+
 if __name__ == "__main__":
     heights = read_txt_file_contents("09-height_map.txt")
     grid = SmokeMap(heights)
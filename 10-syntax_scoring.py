@@ -77,8 +77,12 @@ subsystem. What is the total syntax error score for those errors?
 
 """
 
+import heapq
+import timeit
 import unittest
+from collections import namedtuple
 from helper_functions import read_txt_file_contents
+from multiprocessing import Pool
 from statistics import median
 
 
@@ -98,27 +102,8 @@ class ScoreLine:
         return 0 if not self._completion_scores else median(self._completion_scores)
 
     def parse_line(self, bracket_string):
-        unclosed = []
-        completion_score = 0
-        valid_string = True
-        for char in bracket_string:
-            if char in "([{<":
-                unclosed += char
-            elif not unclosed:
-                self.error_score += self.error_cost[char]
-                valid_string = False
-                break
-            else:
-                last_open = unclosed.pop()
-                expected_bracket = self.inverse_brackets[last_open]
-                if char != expected_bracket:
-                    self.error_score += self.error_cost[char]
-                    valid_string = False
-                    break
-        if valid_string:
-            for char in unclosed[::-1]:
-                completion_score *= 5
-                completion_score += self.completion_cost[char]
+        error_score, completion_score = score_line(bracket_string)
+        self.error_score += error_score
         self._completion_scores += [completion_score] if completion_score else []
 
     def parse_lines(self):
@@ -127,6 +112,88 @@ class ScoreLine:
             self.parse_line(bracket_string)
 
 
+def score_line(bracket_string):
+    """
+    Pure version of ScoreLine.parse_line, returns (error_score,
+    completion_score) for a single line without touching any state
+    """
+    unclosed = []
+    for char in bracket_string:
+        if char in ScoreLine.inverse_brackets:
+            unclosed.append(char)
+        elif not unclosed or char != ScoreLine.inverse_brackets[unclosed.pop()]:
+            return ScoreLine.error_cost[char], 0
+    completion_score = 0
+    for char in reversed(unclosed):
+        completion_score = completion_score * 5 + ScoreLine.completion_cost[char]
+    return 0, completion_score
+
+
+def score_chunk(nav_strings):
+    """
+    Score a chunk of lines, returns the total error score and the list of
+    non zero completion scores
+    """
+    error_score = 0
+    completion_scores = []
+    for bracket_string in nav_strings:
+        line_error, line_completion = score_line(bracket_string.strip())
+        error_score += line_error
+        if line_completion:
+            completion_scores.append(line_completion)
+    return error_score, completion_scores
+
+
+class RunningMedian:
+    """
+    Median of a stream of numbers. The lower half is kept in a max heap
+    (as negatives) and the upper half in a min heap, with the lower half
+    holding the extra value when the count is odd
+    """
+
+    def __init__(self):
+        self.lower_half = []
+        self.upper_half = []
+
+    def __len__(self):
+        return len(self.lower_half) + len(self.upper_half)
+
+    def add(self, value):
+        if self.lower_half and value > -self.lower_half[0]:
+            heapq.heappush(self.upper_half, value)
+        else:
+            heapq.heappush(self.lower_half, -value)
+        if len(self.lower_half) > len(self.upper_half) + 1:
+            heapq.heappush(self.upper_half, -heapq.heappop(self.lower_half))
+        elif len(self.upper_half) > len(self.lower_half):
+            heapq.heappush(self.lower_half, -heapq.heappop(self.upper_half))
+
+    @property
+    def median(self):
+        if not self.lower_half:
+            return 0
+        if len(self.lower_half) > len(self.upper_half):
+            return -self.lower_half[0]
+        return (-self.lower_half[0] + self.upper_half[0]) / 2
+
+
+def score_lines_parallel(nav_strings, processes=None, chunk_size=10000):
+    """
+    Score the lines in chunks across a process pool. The error scores are
+    summed and the completion scores fed into a RunningMedian as each chunk
+    finishes. Returns (error_score, completion_score)
+    """
+    chunks = (nav_strings[i: i + chunk_size] for i in range(0, len(nav_strings), chunk_size))
+    error_score = 0
+    completion_scores = RunningMedian()
+    with Pool(processes) as pool:
+        for chunk_error, chunk_completions in pool.imap_unordered(score_chunk, chunks):
+            error_score += chunk_error
+            for completion_score in chunk_completions:
+                completion_scores.add(completion_score)
+    return error_score, completion_scores.median
+
+
 """
 --- Part Two ---
 Now, discard the corrupted lines. The remaining lines are incomplete.
@@ -185,6 +252,135 @@ strings, and sort the scores. What is the middle score?
 """
 
 
+def build_opcode_table():
+    """
+    Translation table for bytes.translate. Opening brackets become opcodes
+    1-4, their closing brackets 5-8 and newlines stay as 10. Every other
+    byte maps to 0 and is listed in IGNORED_BYTES to be deleted
+    """
+    table = bytearray(256)
+    for opcode, (opening, closing) in enumerate(ScoreLine.inverse_brackets.items(), 1):
+        table[ord(opening)] = opcode
+        table[ord(closing)] = opcode + 4
+    table[ord("\n")] = ord("\n")
+    return bytes(table)
+
+
+OPCODE_TABLE = build_opcode_table()
+IGNORED_BYTES = bytes(byte for byte in range(256) if not OPCODE_TABLE[byte])
+OPCODE_ERROR_COST = [0] * 5 + [ScoreLine.error_cost[closing] for closing in ScoreLine.inverse_brackets.values()]
+OPCODE_COMPLETION_COST = [0] + [ScoreLine.completion_cost[opening] for opening in ScoreLine.inverse_brackets]
+
+
+def scan_navigation_log(nav_data):
+    """
+    Score a whole navigation log in one pass over its bytes.
+    The log is translated to opcodes once, then each line runs through a
+    stack machine on a preallocated bytearray, with the scores looked up
+    from lists indexed by opcode.
+    Returns (error_score, completion_score) like ScoreLine
+    """
+    if isinstance(nav_data, list):
+        nav_data = "\n".join(nav_data)
+    if isinstance(nav_data, str):
+        nav_data = nav_data.encode()
+    opcode_lines = nav_data.translate(OPCODE_TABLE, IGNORED_BYTES).split(b"\n")
+    stack = bytearray(max(map(len, opcode_lines), default=0))
+    error_score = 0
+    completion_scores = RunningMedian()
+    for opcode_line in opcode_lines:
+        depth = 0
+        for opcode in opcode_line:
+            if opcode < 5:
+                stack[depth] = opcode
+                depth += 1
+            elif depth and stack[depth - 1] == opcode - 4:
+                depth -= 1
+            else:
+                error_score += OPCODE_ERROR_COST[opcode]
+                break
+        else:
+            if depth:
+                completion_score = 0
+                for i in range(depth - 1, -1, -1):
+                    completion_score = completion_score * 5 + OPCODE_COMPLETION_COST[stack[i]]
+                completion_scores.add(completion_score)
+    return error_score, completion_scores.median
+
+
+SyntaxEvent = namedtuple("SyntaxEvent", ["kind", "line_number", "score"])
+
+
+class StreamingSyntaxChecker:
+    """
+    Syntax checker for a navigation feed that arrives in arbitrary chunks.
+    The bracket stack is kept between feed calls, so lines can be split
+    anywhere. feed returns the events completed by that chunk:
+        - an "error" event as soon as a corrupt closing bracket is seen, the
+          rest of that line is then skipped
+        - a "completion" event at the end of an incomplete line
+    close flushes a final line that has no trailing newline
+    """
+
+    def __init__(self):
+        self.stack = bytearray()
+        self.line_number = 0
+        self.corrupted = False
+        self.error_score = 0
+        self._completion_scores = RunningMedian()
+
+    @property
+    def completion_score(self):
+        return self._completion_scores.median
+
+    def feed(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        events = []
+        for opcode in chunk.translate(OPCODE_TABLE, IGNORED_BYTES):
+            if opcode == 10:
+                self.end_line(events)
+            elif self.corrupted:
+                continue
+            elif opcode < 5:
+                self.stack.append(opcode)
+            elif self.stack and self.stack[-1] == opcode - 4:
+                self.stack.pop()
+            else:
+                self.corrupted = True
+                self.error_score += OPCODE_ERROR_COST[opcode]
+                events.append(SyntaxEvent("error", self.line_number, OPCODE_ERROR_COST[opcode]))
+        return events
+
+    def close(self):
+        events = []
+        if self.stack or self.corrupted:
+            self.end_line(events)
+        return events
+
+    def end_line(self, events):
+        if self.stack and not self.corrupted:
+            completion_score = 0
+            for opcode in reversed(self.stack):
+                completion_score = completion_score * 5 + OPCODE_COMPLETION_COST[opcode]
+            self._completion_scores.add(completion_score)
+            events.append(SyntaxEvent("completion", self.line_number, completion_score))
+        self.stack.clear()
+        self.corrupted = False
+        self.line_number += 1
+
+
+def benchmark_scanners(nav_strings, repeats=5):
+    """
+    Seconds per pass over nav_strings for ScoreLine and scan_navigation_log
+    """
+    nav_bytes = "".join(nav_strings).encode()
+    return {
+        "ScoreLine": min(timeit.repeat(lambda: ScoreLine(nav_strings), number=1, repeat=repeats)),
+        "scan_navigation_log": min(timeit.repeat(lambda: scan_navigation_log(nav_bytes), number=1, repeat=repeats)),
+    }
+
+
 class TestScoreLine(unittest.TestCase):
 
     @classmethod
@@ -272,6 +468,87 @@ class TestScoreLine(unittest.TestCase):
                 self.assertEqual(actual, expected_result)
 
 
+class TestScoreLinesParallel(unittest.TestCase):
+
+    def test_score_line(self):
+        self.assertEqual(score_line('{([(<{}[<>[]}>{[]{[(<()>'), (1197, 0))
+        self.assertEqual(score_line('[({(<(())[]>[[{[]{<()<>>'), (0, 288957))
+        self.assertEqual(score_line('()'), (0, 0))
+
+    def test_running_median(self):
+        values = [5, 1, 9, 3, 3, 12, 7, 0, 4]
+        running_median = RunningMedian()
+        for i, value in enumerate(values):
+            running_median.add(value)
+            with self.subTest(f"values - {values[:i + 1]}"):
+                self.assertEqual(running_median.median, median(values[:i + 1]))
+                self.assertEqual(len(running_median), i + 1)
+
+    def test_matches_score_line(self):
+        nav_data = read_txt_file_contents("10-nav_subsystem.txt")
+        scored_lines = ScoreLine(nav_data)
+        for chunk_size in [1, 7, 10000]:
+            with self.subTest(f"chunk size - {chunk_size}"):
+                actual = score_lines_parallel(nav_data, processes=2, chunk_size=chunk_size)
+                self.assertEqual(actual, (scored_lines.error_score, scored_lines.completion_score))
+
+
+class TestScanNavigationLog(unittest.TestCase):
+
+    def test_matches_score_line(self):
+        test_cases = [
+            [")"], ["{)"], ["("], ["<"], ["()"], [""],
+            ['{([(<{}[<>[]}>{[]{[(<()>'],
+            ['[({(<(())[]>[[{[]{<()<>>', '[(()[<>])]({[<{<<[]>>(', '<{([{{}}[<[[[<>{}]]]>[]]'],
+            read_txt_file_contents("10-nav_subsystem.txt"),
+        ]
+        for test_case in test_cases:
+            with self.subTest(f"test case - {test_case[:3]}"):
+                scored_lines = ScoreLine(test_case)
+                expected = (scored_lines.error_score, scored_lines.completion_score)
+                self.assertEqual(scan_navigation_log(test_case), expected)
+                self.assertEqual(scan_navigation_log("\n".join(test_case).encode()), expected)
+
+    def test_opcode_table(self):
+        self.assertEqual(b"([{<)]}>\n x".translate(OPCODE_TABLE), bytes([1, 2, 3, 4, 5, 6, 7, 8, 10, 0, 0]))
+        self.assertEqual(b"(\r\n) x".translate(OPCODE_TABLE, IGNORED_BYTES), bytes([1, 10, 5]))
+
+    def test_benchmark_scanners(self):
+        timings = benchmark_scanners(read_txt_file_contents("10-nav_subsystem.txt"), repeats=1)
+        self.assertEqual(set(timings), {"ScoreLine", "scan_navigation_log"})
+        for timing in timings.values():
+            self.assertIsInstance(timing, float)
+            self.assertGreater(timing, 0)
+
+
+class TestStreamingSyntaxChecker(unittest.TestCase):
+
+    def test_error_before_line_end(self):
+        checker = StreamingSyntaxChecker()
+        self.assertEqual(checker.feed("{([(<{}[<>[]}"), [SyntaxEvent("error", 0, 1197)])
+        self.assertEqual(checker.feed(">{[]{[(<()>\n[({(<(())[]>[[{[]{"), [])
+        self.assertEqual(checker.feed("<()<>>"), [])
+        self.assertEqual(checker.close(), [SyntaxEvent("completion", 1, 288957)])
+        self.assertEqual(checker.close(), [])
+
+    def test_matches_score_line(self):
+        nav_data = read_txt_file_contents("10-nav_subsystem.txt")
+        scored_lines = ScoreLine(nav_data)
+        nav_bytes = "".join(nav_data).encode()
+        for chunk_size in [1, 5, 64, len(nav_bytes)]:
+            with self.subTest(f"chunk size - {chunk_size}"):
+                checker = StreamingSyntaxChecker()
+                events = []
+                for i in range(0, len(nav_bytes), chunk_size):
+                    events += checker.feed(nav_bytes[i: i + chunk_size])
+                events += checker.close()
+                self.assertEqual(checker.line_number, len(nav_data))
+                self.assertEqual(checker.error_score, scored_lines.error_score)
+                self.assertEqual(checker.completion_score, scored_lines.completion_score)
+                self.assertEqual(sum(event.score for event in events if event.kind == "error"),
+                                 scored_lines.error_score)
+
+
 if __name__ == "__main__":
     nav_data = read_txt_file_contents("10-nav_subsystem.txt")
     scored_lines = ScoreLine(nav_data)
@@ -322,6 +322,7 @@ Given the starting energy levels of the dumbo octopuses in your cavern,
 simulate 100 steps. How many total flashes are there after 100 steps?
 """
 
+import hashlib
 import unittest
 import numpy
 from helper_functions import read_txt_file_contents
@@ -341,10 +342,16 @@ class Dumbo:
 
     def __init__(self, starting_grid):
         self.flash_count = 0
-        self.grid = numpy.array([[int(num) for num in row if num != "\n"] for row in starting_grid])
+        self.grid = numpy.array([[int(num) for num in row if num != "\n"] for row in starting_grid],
+                                dtype=numpy.uint8)
         self.flash_stack = []
         self.already_flashed = set()
         self.iteration_count = 0
+        self.state_steps = {}
+        self.flash_history = []
+        self.synchronised_steps = set()
+        self.cycle = None
+        self.record_state()
 
     def increment_entire_grid(self):
         for i, row in enumerate(self.grid):
@@ -384,22 +391,232 @@ class Dumbo:
                     self.increment_node(i, j)
         return test_output
 
+    def step(self):
+        """
+        Advance the whole grid one step at once with propagate_flashes
+        """
+        self.iteration_count += 1
+        flashed = propagate_flashes(self.grid)
+        self.flash_count += int(flashed.sum())
+        self.record_state()
+
+    def record_state(self):
+        """
+        Fingerprint the grid after each step. The first time a fingerprint
+        repeats the grid is in a cycle, stored as (cycle_start, cycle_length)
+        """
+        fingerprint = hashlib.blake2b(self.grid.tobytes(), digest_size=16).digest()
+        self.flash_history.append(self.flash_count)
+        if not self.grid.any():
+            self.synchronised_steps.add(self.iteration_count)
+        if self.cycle is None:
+            if fingerprint in self.state_steps:
+                cycle_start = self.state_steps[fingerprint]
+                self.cycle = (cycle_start, self.iteration_count - cycle_start)
+            else:
+                self.state_steps[fingerprint] = self.iteration_count
+
+    def find_cycle(self, max_steps=None):
+        """
+        Step until the grid repeats a previous state, returns the cycle or
+        None if max_steps is reached first
+        """
+        while self.cycle is None:
+            if max_steps is not None and self.iteration_count >= max_steps:
+                return None
+            self.step()
+        return self.cycle
+
+    def simulate_until(self, no_of_steps):
+        """
+        Step until no_of_steps has been simulated or a cycle is found
+        """
+        while len(self.flash_history) <= no_of_steps and self.cycle is None:
+            self.step()
+
+    def equivalent_step(self, no_of_steps):
+        """
+        Step that has already been simulated with the same grid as
+        no_of_steps
+        """
+        self.simulate_until(no_of_steps)
+        if no_of_steps < len(self.flash_history):
+            return no_of_steps
+        cycle_start, cycle_length = self.cycle
+        return cycle_start + (no_of_steps - cycle_start) % cycle_length
+
+    def flash_count_after(self, no_of_steps):
+        """
+        Total flashes after no_of_steps, using the cycle for any step past
+        the ones simulated so far
+        """
+        self.simulate_until(no_of_steps)
+        if no_of_steps < len(self.flash_history):
+            return self.flash_history[no_of_steps]
+        cycle_start, cycle_length = self.cycle
+        no_of_cycles, offset = divmod(no_of_steps - cycle_start, cycle_length)
+        flashes_per_cycle = self.flash_history[cycle_start + cycle_length] - self.flash_history[cycle_start]
+        return self.flash_history[cycle_start + offset] + no_of_cycles * flashes_per_cycle
+
+    def is_synchronised_after(self, no_of_steps):
+        return self.equivalent_step(no_of_steps) in self.synchronised_steps
+
+    @property
+    def synchronises_in_cycle(self):
+        cycle_start, cycle_length = self.cycle
+        return any(cycle_start <= step < cycle_start + cycle_length for step in self.synchronised_steps)
+
     def increment_and_flash(self, no_of_iterations):
         for _ in range(no_of_iterations):
-            self.iteration_count += 1
-            self.flash_stack = []
-            self.already_flashed = set()
-
-            self.increment_entire_grid()
-            for node in self.flash_stack:
-                self.flash_surrounding(*node)
+            self.step()
 
     def flash_until_synchronised(self):
+        """
+        Returns the step the grid next synchronises on, or None if the grid
+        enters a cycle (see self.cycle) that never synchronises
+        """
         while self.grid.sum() != 0:
+            if self.cycle is not None and not self.synchronises_in_cycle:
+                return None
             self.increment_and_flash(1)
         return self.iteration_count
 
 
+class DumboBatch:
+    """
+    Many independent grids of the same shape stepped together as one
+    (batch, height, width) array, using the same propagate_flashes as
+    Dumbo.step. Flash counts and the first synchronised step (-1 until it
+    happens) are kept per grid
+    """
+
+    def __init__(self, starting_grids):
+        if isinstance(starting_grids, numpy.ndarray):
+            self.grids = starting_grids.astype(numpy.uint8)
+        else:
+            self.grids = numpy.array([Dumbo(grid).grid for grid in starting_grids], dtype=numpy.uint8)
+        self.flash_counts = numpy.zeros(len(self.grids), dtype=numpy.int64)
+        self.first_synchronised_step = numpy.full(len(self.grids), -1, dtype=numpy.int64)
+        self.iteration_count = 0
+
+    def step(self):
+        self.iteration_count += 1
+        flashed = propagate_flashes(self.grids)
+        flashes_per_grid = flashed.sum(axis=(1, 2))
+        self.flash_counts += flashes_per_grid
+        newly_synchronised = (flashes_per_grid == flashed[0].size) & (self.first_synchronised_step < 0)
+        self.first_synchronised_step[newly_synchronised] = self.iteration_count
+
+    def increment_and_flash(self, no_of_iterations):
+        for _ in range(no_of_iterations):
+            self.step()
+
+    def flash_until_synchronised(self, max_steps=None):
+        """
+        Step until every grid has synchronised at least once, or max_steps
+        is reached. Returns the first synchronised step of each grid
+        """
+        while (self.first_synchronised_step < 0).any():
+            if max_steps is not None and self.iteration_count >= max_steps:
+                break
+            self.step()
+        return self.first_synchronised_step
+
+
+def propagate_flashes(grids):
+    """
+    Advance grids one step in place. Every octopus is incremented, then
+    flashes spread in waves: each wave adds the number of newly flashing
+    neighbours to every octopus, until a wave flashes nothing new.
+    Everything that flashed is then reset to 0 and the flashed mask is
+    returned. Works on the last two axes like count_flashing_neighbours.
+    Octopuses that have flashed are marked by setting bit 7 (at most 18 is
+    ever reached before that), so a new flash is simply 10 <= value < 128,
+    and every wave reuses the same buffers instead of allocating. Once
+    only a few octopuses are flashing the remaining waves are done sparsely
+    """
+    grids += 1
+    buffers = FlashBuffers(grids.shape)
+    flashing = numpy.greater(grids, 9, out=buffers.flashing)
+    sparse_limit = grids.size // 4096 if grids.flags.c_contiguous else -1
+    while flashing.any():
+        if numpy.count_nonzero(flashing) <= sparse_limit:
+            propagate_sparse_flashes(grids, numpy.flatnonzero(flashing))
+            break
+        grids |= numpy.multiply(flashing.view(numpy.uint8), 128, out=buffers.neighbours)
+        grids += count_flashing_neighbours(flashing, buffers)
+        numpy.subtract(grids, 10, out=buffers.neighbours)
+        numpy.less(buffers.neighbours, 118, out=flashing)
+    flashed = grids >= 128
+    grids *= ~flashed
+    return flashed
+
+
+def propagate_sparse_flashes(grids, flashing):
+    """
+    Finish the waves of propagate_flashes from the flat indices of the
+    flashing octopuses: mark them, add the number of flashing neighbours
+    to each octopus next to one (counted from runs of the sorted neighbour
+    indices) and check only those octopuses for new flashes
+    """
+    flat_grids = grids.reshape(-1)
+    height, width = grids.shape[-2:]
+    while len(flashing):
+        flat_grids[flashing] |= 128
+        rows = flashing // width % height
+        columns = flashing % width
+        neighbours = []
+        for row_offset in (-1, 0, 1):
+            for column_offset in (-1, 0, 1):
+                if row_offset or column_offset:
+                    in_bounds = (
+                        (0 <= rows + row_offset) & (rows + row_offset < height)
+                        & (0 <= columns + column_offset) & (columns + column_offset < width)
+                    )
+                    neighbours.append(flashing[in_bounds] + row_offset * width + column_offset)
+        neighbours = numpy.sort(numpy.concatenate(neighbours))
+        run_starts = numpy.flatnonzero(numpy.diff(neighbours, prepend=-1))
+        counts = numpy.diff(run_starts, append=len(neighbours))
+        neighbours = neighbours[run_starts]
+        flat_grids[neighbours] += counts.astype(numpy.uint8)
+        values = flat_grids[neighbours]
+        flashing = neighbours[(values >= 10) & (values < 128)]
+
+
+class FlashBuffers:
+    """
+    Preallocated arrays for one propagate_flashes call: the zero bordered
+    uint8 copy of the flashing mask, the row sums and the neighbour counts
+    """
+
+    def __init__(self, shape):
+        *batch, height, width = shape
+        self.padded = numpy.zeros((*batch, height + 2, width + 2), dtype=numpy.uint8)
+        self.row_sums = numpy.empty((*batch, height, width + 2), dtype=numpy.uint8)
+        self.neighbours = numpy.empty(shape, dtype=numpy.uint8)
+        self.flashing = numpy.empty(shape, dtype=bool)
+
+
+def count_flashing_neighbours(flashing, buffers=None):
+    """
+    Number of the 8 neighbours of each octopus that are flashing, from
+    shifted adds of the zero padded mask (rows then columns, minus the
+    octopus itself). Works on the last two axes so a stack of grids can be
+    counted at once. With buffers (a FlashBuffers) everything is done in
+    place and the returned array is buffers.neighbours
+    """
+    if buffers is None:
+        buffers = FlashBuffers(flashing.shape)
+    padded, row_sums, neighbours = buffers.padded, buffers.row_sums, buffers.neighbours
+    padded[..., 1:-1, 1:-1] = flashing
+    numpy.add(padded[..., :-2, :], padded[..., 1:-1, :], out=row_sums)
+    row_sums += padded[..., 2:, :]
+    numpy.add(row_sums[..., :, :-2], row_sums[..., :, 1:-1], out=neighbours)
+    neighbours += row_sums[..., :, 2:]
+    neighbours -= flashing.view(numpy.uint8)
+    return neighbours
+
+
 """
 --- Part Two ---
 It seems like the individual flashes aren't bright enough to navigate. However,
@@ -614,6 +831,123 @@ class TestDumbo(unittest.TestCase):
         self.assertEqual(actual, expected_result)
 
 
+class TestCountFlashingNeighbours(unittest.TestCase):
+
+    def test_count_flashing_neighbours(self):
+        flashing = numpy.array([[1, 0, 0], [0, 1, 0], [0, 0, 0], [1, 1, 1]], dtype=bool)
+        expected = [[1, 2, 1], [2, 1, 1], [3, 4, 3], [1, 2, 1]]
+        self.assertEqual(count_flashing_neighbours(flashing).tolist(), expected)
+        self.assertEqual(count_flashing_neighbours(numpy.stack([flashing, ~flashing]))[0].tolist(), expected)
+
+
+class TestPropagateFlashes(unittest.TestCase):
+
+    @staticmethod
+    def dense_step(grids):
+        grids += 1
+        flashed = numpy.zeros(grids.shape, dtype=bool)
+        flashing = grids > 9
+        while flashing.any():
+            flashed |= flashing
+            grids += count_flashing_neighbours(flashing)
+            flashing = (grids > 9) & ~flashed
+        grids[flashed] = 0
+        return flashed
+
+    def test_matches_dense_waves(self):
+        random_grids = numpy.random.default_rng(11).integers(0, 10, (3, 200, 200), dtype=numpy.uint8)
+        for grids in [random_grids[0].copy(), random_grids.copy()]:
+            with self.subTest(f"shape - {grids.shape}"):
+                expected_grids = grids.copy()
+                for _ in range(10):
+                    expected_flashed = self.dense_step(expected_grids)
+                    self.assertEqual(propagate_flashes(grids).tolist(), expected_flashed.tolist())
+                    self.assertEqual(grids.tolist(), expected_grids.tolist())
+
+    def test_sparse_flashes(self):
+        grid = numpy.full((100, 100), 7, dtype=numpy.uint8)
+        grid[0, 0] = grid[50, 50] = grid[99, 98] = 9
+        grid[51, 51] = 8
+        expected = grid.copy()
+        expected_flashed = self.dense_step(expected)
+        self.assertGreater(int(expected_flashed.sum()), 4)
+        self.assertEqual(propagate_flashes(grid).tolist(), expected_flashed.tolist())
+        self.assertEqual(grid.tolist(), expected.tolist())
+
+
+class TestDumboCycles(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.test_grid = [
+            '5483143223',
+            '2745854711',
+            '5264556173',
+            '6141336146',
+            '6357385478',
+            '4167524645',
+            '2176841721',
+            '6882881134',
+            '4846848554',
+            '5283751526']
+
+    def test_find_cycle(self):
+        dumbo = Dumbo(self.test_grid)
+        self.assertIsNone(dumbo.find_cycle(max_steps=100))
+        self.assertEqual(dumbo.find_cycle(), (195, 10))
+
+    def test_flash_count_after(self):
+        dumbo = Dumbo(self.test_grid)
+        self.assertEqual(dumbo.flash_count_after(10), 204)
+        self.assertEqual(dumbo.flash_count_after(100), 1656)
+        simulated = Dumbo(self.test_grid)
+        simulated.increment_and_flash(437)
+        self.assertEqual(dumbo.flash_count_after(437), simulated.flash_count)
+        self.assertEqual(dumbo.flash_count_after(10 ** 12 + 195), dumbo.flash_count_after(195) + 10 ** 13)
+
+    def test_is_synchronised_after(self):
+        dumbo = Dumbo(self.test_grid)
+        self.assertFalse(dumbo.is_synchronised_after(194))
+        self.assertTrue(dumbo.is_synchronised_after(195))
+        self.assertTrue(dumbo.is_synchronised_after(195 + 10 ** 12))
+        self.assertFalse(dumbo.is_synchronised_after(196 + 10 ** 12))
+
+    def test_never_synchronises(self):
+        dumbo = Dumbo(['05'])
+        self.assertIsNone(dumbo.flash_until_synchronised())
+        self.assertEqual(dumbo.cycle, (0, 9))
+        self.assertFalse(dumbo.is_synchronised_after(10 ** 9))
+        self.assertEqual(dumbo.flash_count_after(9 * 10 ** 9), 2 * 10 ** 9)
+
+
+class TestDumboBatch(unittest.TestCase):
+
+    def test_matches_dumbo(self):
+        grids = [
+            ['5483143223', '2745854711', '5264556173', '6141336146', '6357385478',
+             '4167524645', '2176841721', '6882881134', '4846848554', '5283751526'],
+            read_txt_file_contents("11-octupus_lights.txt"),
+            ['1' * 10] * 10,
+            ['0000000000'] * 9 + ['0000000005'],
+        ]
+        batch = DumboBatch(grids)
+        batch.increment_and_flash(100)
+        synchronised_steps = batch.flash_until_synchronised(max_steps=1000)
+        for i, grid in enumerate(grids):
+            with self.subTest(f"grid - {i}"):
+                dumbo = Dumbo(grid)
+                dumbo.increment_and_flash(100)
+                self.assertEqual(batch.flash_counts[i], dumbo.flash_count_after(batch.iteration_count))
+                dumbo = Dumbo(grid)
+                self.assertEqual(synchronised_steps[i], dumbo.flash_until_synchronised())
+        self.assertEqual(synchronised_steps[0], 195)
+
+    def test_max_steps(self):
+        batch = DumboBatch(numpy.array([[[0, 5]], [[1, 1]]]))
+        self.assertEqual(batch.flash_until_synchronised(max_steps=50).tolist(), [-1, 9])
+        self.assertEqual(batch.iteration_count, 50)
+
+
 if __name__ == "__main__":
     octupi = read_txt_file_contents("11-octupus_lights.txt")
     dumbo = Dumbo(octupi)
@@ -116,9 +116,12 @@ Finally, this even larger example has 226 paths through it:
 
 How many paths through this cave system are there that visit small caves at most once?
 """
+import os
 import unittest
 from collections import deque, defaultdict
+from functools import lru_cache
 from helper_functions import read_txt_file_contents
+from multiprocessing import Pool
 import re
 
 """
@@ -133,10 +136,33 @@ if node == 'end' => path_count += 1
 """
 
 
+class VisitPolicy:
+    """
+    How many times small caves can be visited. Each small cave can be
+    visited up to visit_limits[name] times (default max_revisits + 1), and
+    the visits after the first, added up over every small cave, can't go
+    over max_revisits. With max_revisits=None there's no total budget and
+    only the per cave limits apply (default 1).
+    Part 1 is VisitPolicy(0) and part 2 is VisitPolicy(1). start and end are
+    always visited once
+    """
+
+    def __init__(self, max_revisits=0, visit_limits=None):
+        self.max_revisits = max_revisits
+        self.visit_limits = visit_limits or {}
+
+    def visit_limit(self, cave_name):
+        if cave_name in ('start', 'end'):
+            return 1
+        default_limit = 1 if self.max_revisits is None else self.max_revisits + 1
+        return self.visit_limits.get(cave_name, default_limit)
+
+
 class Cave:
 
     def __init__(self, input_data):
         self.cave_map = self.create_cave_map(input_data)
+        self.intern_caves()
         # self.visited = set()
         # self.queue = deque(self.cave_map['start'])
         # self.calculate_no_of_paths('start')
@@ -152,6 +178,156 @@ class Cave:
                 cave_map[b].add(a)
         return cave_map
 
+    def intern_caves(self):
+        """
+        Give every cave an integer id, with the small caves numbered first so
+        their ids are the bit positions in a visited mask.
+        neighbour_ids[i] is the tuple of caves reachable from cave i
+        """
+        cave_names = set(self.cave_map) | {cave for caves in self.cave_map.values() for cave in caves}
+        self.cave_names = sorted(cave_names, key=lambda name: (not name.islower(), name))
+        self.cave_ids = {name: i for i, name in enumerate(self.cave_names)}
+        self.is_small = [name.islower() for name in self.cave_names]
+        self.neighbour_ids = [
+            tuple(sorted(self.cave_ids[cave] for cave in self.cave_map.get(name, ())))
+            for name in self.cave_names
+        ]
+        self.small_cave_weights = None
+        self.weighted_neighbours = None
+
+    def compile_small_cave_graph(self):
+        """
+        Contract the big caves out of the map. As long as no two big caves
+        are connected, a big cave only links the small caves either side of
+        it, so small_cave_weights[u][v] is the number of ways to get from
+        small cave u to small cave v: the direct passage plus one for every
+        big cave between them (u to u through a big cave is a self loop).
+        The result is kept on the Cave so repeated queries reuse it
+        """
+        if self.small_cave_weights is not None:
+            return self.small_cave_weights
+        no_of_small_caves = sum(self.is_small)
+        weights = [[0] * no_of_small_caves for _ in range(no_of_small_caves)]
+        for node in range(no_of_small_caves):
+            for neighbour in self.neighbour_ids[node]:
+                if self.is_small[neighbour]:
+                    weights[node][neighbour] += 1
+                    continue
+                for next_node in self.neighbour_ids[neighbour]:
+                    if not self.is_small[next_node]:
+                        raise ValueError(f"Big caves {self.cave_names[neighbour]} and "
+                                         f"{self.cave_names[next_node]} are connected, infinite paths")
+                    weights[node][next_node] += 1
+        self.small_cave_weights = weights
+        self.weighted_neighbours = [
+            tuple((next_node, weight) for next_node, weight in enumerate(row) if weight) for row in weights
+        ]
+        return weights
+
+    def count_paths(self, allow_twice=False):
+        """
+        Count the paths without listing them. The number of paths from a
+        cave only depends on (cave, small caves visited as a bitmask, whether
+        the one repeat visit is used), so each of those states is counted
+        once and memoized. Runs over the contracted small cave graph, where
+        each step is multiplied by the number of ways to make it
+        """
+        start, end = self.cave_ids.get('start'), self.cave_ids.get('end')
+        if start is None or end is None:
+            return 0
+        self.compile_small_cave_graph()
+
+        @lru_cache(maxsize=None)
+        def paths_from(node, visited, twice_used):
+            if node == end:
+                return 1
+            paths = 0
+            for neighbour, weight in self.weighted_neighbours[node]:
+                if not visited >> neighbour & 1:
+                    paths += weight * paths_from(neighbour, visited | 1 << neighbour, twice_used)
+                elif allow_twice and not twice_used:
+                    paths += weight * paths_from(neighbour, visited, True)
+            return paths
+
+        return paths_from(start, 1 << start, False)
+
+    def count_paths_with_policy(self, policy, processes=1, split_depth=2):
+        """
+        Count the paths allowed by a VisitPolicy over the contracted graph.
+        With processes > 1 the paths are expanded split_depth steps from
+        start, the resulting states are merged and shared out across a
+        process pool, and the counts from each worker are added up
+        """
+        start, end = self.cave_ids.get('start'), self.cave_ids.get('end')
+        if start is None or end is None:
+            return 0
+        self.compile_small_cave_graph()
+        visit_limits = tuple(policy.visit_limit(self.cave_names[node]) for node in range(len(self.weighted_neighbours)))
+        counter = PolicyPathCounter(self.weighted_neighbours, visit_limits, policy.max_revisits, end)
+        start_state = (start, counter.visit(0, start), 0)
+        if processes == 1:
+            return counter.paths_from(*start_state)
+
+        paths_to_end = 0
+        frontier = {start_state: 1}
+        for _ in range(split_depth):
+            next_frontier = defaultdict(int)
+            for state, multiplicity in frontier.items():
+                for next_state, weight in counter.next_states(*state):
+                    if next_state[0] == end:
+                        paths_to_end += multiplicity * weight
+                    else:
+                        next_frontier[next_state] += multiplicity * weight
+            frontier = next_frontier
+        frontier = list(frontier.items())
+        no_of_chunks = processes or os.cpu_count()
+        chunks = [(counter, frontier[i::no_of_chunks]) for i in range(no_of_chunks)]
+        with Pool(processes) as pool:
+            return paths_to_end + sum(pool.map(count_frontier_paths, chunks))
+
+    def iterate_paths(self, policy=None):
+        """
+        Lazily yield every path allowed by the policy (default VisitPolicy(0))
+        as a tuple of cave ids. Walks the graph with an explicit stack of
+        neighbour iterators and a single list of visit counts that is undone
+        on the way back, so memory only grows with the depth of the path
+        """
+        policy = policy or VisitPolicy(0)
+        start, end = self.cave_ids.get('start'), self.cave_ids.get('end')
+        if start is None or end is None:
+            return
+        self.compile_small_cave_graph()
+        visit_limits = [policy.visit_limit(name) if small else None
+                        for name, small in zip(self.cave_names, self.is_small)]
+        visits = [0] * len(self.cave_names)
+        visits[start] = 1
+        revisits_used = 0
+        path = [start]
+        stack = [iter(self.neighbour_ids[start])]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                last_node = path.pop()
+                if self.is_small[last_node]:
+                    visits[last_node] -= 1
+                    if visits[last_node]:
+                        revisits_used -= 1
+                continue
+            if node == end:
+                yield tuple(path) + (end,)
+                continue
+            if self.is_small[node]:
+                if visits[node] >= visit_limits[node]:
+                    continue
+                if visits[node]:
+                    if policy.max_revisits is not None and revisits_used >= policy.max_revisits:
+                        continue
+                    revisits_used += 1
+                visits[node] += 1
+            path.append(node)
+            stack.append(iter(self.neighbour_ids[node]))
+
     def calculate_no_of_paths(self, current_node='start', seen=None):
         paths = 0
         if current_node == 'end':
@@ -187,6 +363,63 @@ class Cave:
             paths += self.calculate_no_of_paths_part_2(node, child_visited, visited_twice)
         return paths
 
+class PolicyPathCounter:
+    """
+    Memoized path counter over the contracted small cave graph for a given
+    set of visit limits (indexed by cave id) and total revisit budget.
+    The visit counts are packed into a single int, bits_per_cave bits for
+    each cave, so a state is (cave, visit counts, revisits used)
+    """
+
+    def __init__(self, weighted_neighbours, visit_limits, max_revisits, end):
+        self.weighted_neighbours = weighted_neighbours
+        self.visit_limits = visit_limits
+        self.max_revisits = max_revisits
+        self.end = end
+        self.bits_per_cave = max(visit_limits).bit_length()
+        self.count_mask = (1 << self.bits_per_cave) - 1
+        self.paths_from = lru_cache(maxsize=None)(self._paths_from)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['paths_from']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.paths_from = lru_cache(maxsize=None)(self._paths_from)
+
+    def visit(self, visit_counts, node):
+        return visit_counts + (1 << node * self.bits_per_cave)
+
+    def next_states(self, node, visit_counts, revisits_used):
+        for neighbour, weight in self.weighted_neighbours[node]:
+            visits = visit_counts >> neighbour * self.bits_per_cave & self.count_mask
+            if visits >= self.visit_limits[neighbour]:
+                continue
+            if visits and self.max_revisits is not None:
+                if revisits_used == self.max_revisits:
+                    continue
+                yield (neighbour, self.visit(visit_counts, neighbour), revisits_used + 1), weight
+            else:
+                yield (neighbour, self.visit(visit_counts, neighbour), revisits_used), weight
+
+    def _paths_from(self, node, visit_counts, revisits_used):
+        if node == self.end:
+            return 1
+        return sum(weight * self.paths_from(*next_state)
+                   for next_state, weight in self.next_states(node, visit_counts, revisits_used))
+
+
+def count_frontier_paths(counter_and_frontier):
+    """
+    Process pool worker, the number of paths from every state in a chunk of
+    the frontier, sharing one memo
+    """
+    counter, frontier = counter_and_frontier
+    return sum(multiplicity * counter.paths_from(*state) for state, multiplicity in frontier)
+
+
 """
 --- Part Two ---
 After reviewing the available paths, you realize you might have time to visit 
@@ -333,6 +566,77 @@ class TestPathCount(unittest.TestCase):
                 actual = cave.calculate_no_of_paths()
                 self.assertEqual(actual, expected_result)
 
+    def test_count_paths(self):
+        for test_case, expected_result in self.test_cases:
+            with self.subTest():
+                self.assertEqual(Cave(test_case).count_paths(), expected_result)
+        for test_case, expected_result in self.part_2_test_cases:
+            with self.subTest():
+                self.assertEqual(Cave(test_case).count_paths(allow_twice=True), expected_result)
+        cave_data = read_txt_file_contents("12-cave_map.txt")
+        cave = Cave(cave_data)
+        self.assertEqual(cave.count_paths(), cave.calculate_no_of_paths())
+        self.assertEqual(cave.count_paths(allow_twice=True), cave.calculate_no_of_paths_part_2())
+
+    def test_compile_small_cave_graph(self):
+        cave = Cave(['start-A', 'start-b', 'A-c', 'A-b', 'b-d', 'A-end', 'b-end'])
+        self.assertEqual(cave.cave_names, ['b', 'c', 'd', 'end', 'start', 'A'])
+        expected = [
+            [1, 1, 1, 2, 0],
+            [1, 1, 0, 1, 0],
+            [1, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0],
+            [2, 1, 0, 1, 0],
+        ]
+        self.assertEqual(cave.compile_small_cave_graph(), expected)
+        self.assertIs(cave.compile_small_cave_graph(), cave.small_cave_weights)
+
+    def test_connected_big_caves(self):
+        with self.assertRaises(ValueError):
+            Cave(['start-A', 'A-B', 'B-end']).count_paths()
+
+    def test_count_paths_with_policy(self):
+        for test_case, expected_result in self.test_cases:
+            with self.subTest():
+                self.assertEqual(Cave(test_case).count_paths_with_policy(VisitPolicy(0)), expected_result)
+        for test_case, expected_result in self.part_2_test_cases:
+            for processes in [1, 2]:
+                with self.subTest(f"processes - {processes}"):
+                    cave = Cave(test_case)
+                    self.assertEqual(cave.count_paths_with_policy(VisitPolicy(1), processes), expected_result)
+
+    def test_general_policies(self):
+        def brute_force_paths(cave, policy, node='start', visits=None):
+            visits = defaultdict(int) if visits is None else visits
+            if node == 'end':
+                return 1
+            revisits = sum(count - 1 for name, count in visits.items() if name.islower() and count > 1)
+            if node.islower():
+                if visits[node] >= policy.visit_limit(node):
+                    return 0
+                if visits[node] and policy.max_revisits is not None and revisits >= policy.max_revisits:
+                    return 0
+            visits[node] += 1
+            paths = sum(brute_force_paths(cave, policy, next_node, visits) for next_node in cave.cave_map[node])
+            visits[node] -= 1
+            return paths
+
+        policies = [
+            VisitPolicy(2),
+            VisitPolicy(3, {'b': 2}),
+            VisitPolicy(None, {'b': 3, 'c': 2}),
+            VisitPolicy(2, {'d': 3, 'c': 1}),
+        ]
+        cave = Cave(['start-A', 'start-b', 'A-c', 'A-b', 'b-d', 'A-end', 'b-end'])
+        for policy in policies:
+            for processes in [1, 2]:
+                with self.subTest(f"{policy.max_revisits} {policy.visit_limits} - {processes}"):
+                    self.assertEqual(cave.count_paths_with_policy(policy, processes, split_depth=3),
+                                     brute_force_paths(cave, policy))
+
+    def test_count_paths_without_end(self):
+        self.assertEqual(Cave(['start-A', 'A-b']).count_paths(), 0)
+
     def test_path_count_part_2(self):
         for test_case, expected_result in self.part_2_test_cases:
             with self.subTest():
@@ -341,6 +645,40 @@ class TestPathCount(unittest.TestCase):
                 self.assertEqual(actual, expected_result)
 
 
+class TestIteratePaths(unittest.TestCase):
+
+    def test_iterate_paths(self):
+        cave = Cave(['start-A', 'start-b', 'A-c', 'A-b', 'b-d', 'A-end', 'b-end'])
+        paths = {",".join(cave.cave_names[node] for node in path) for path in cave.iterate_paths()}
+        expected = {
+            'start,A,b,A,c,A,end', 'start,A,b,A,end', 'start,A,b,end', 'start,A,c,A,b,A,end',
+            'start,A,c,A,b,end', 'start,A,c,A,end', 'start,A,end', 'start,b,A,c,A,end',
+            'start,b,A,end', 'start,b,end',
+        }
+        self.assertEqual(paths, expected)
+
+    def test_matches_count_paths(self):
+        test_cases = [
+            ['start-A', 'start-b', 'A-c', 'A-b', 'b-d', 'A-end', 'b-end'],
+            ['dc-end', 'HN-start', 'start-kj', 'dc-start', 'dc-HN', 'LN-dc', 'HN-end', 'kj-sa', 'kj-HN', 'kj-dc'],
+            read_txt_file_contents("12-cave_map.txt"),
+        ]
+        for test_case in test_cases:
+            cave = Cave(test_case)
+            for policy in [VisitPolicy(0), VisitPolicy(1), VisitPolicy(None, {'b': 3, 'kj': 2})]:
+                with self.subTest(f"{test_case[:2]} - {policy.max_revisits}"):
+                    paths = list(cave.iterate_paths(policy))
+                    self.assertEqual(len(paths), cave.count_paths_with_policy(policy))
+                    self.assertEqual(len(set(paths)), len(paths))
+
+    def test_lazy(self):
+        cave = Cave(read_txt_file_contents("12-cave_map.txt"))
+        paths = cave.iterate_paths(VisitPolicy(1))
+        first_path = next(paths)
+        self.assertEqual(cave.cave_names[first_path[0]], 'start')
+        self.assertEqual(cave.cave_names[first_path[-1]], 'end')
+
+
 if __name__ == '__main__':
     cave_data = read_txt_file_contents("12-cave_map.txt")
     cave = Cave(cave_data)
@@ -138,6 +138,7 @@ your transparent paper?
 """
 import unittest
 import re
+import numpy
 from helper_functions import read_txt_file_contents
 
 
@@ -197,6 +198,128 @@ def parse_input(input_data):
     return points, folds
 
 
+def parse_input_array(input_data):
+    """
+    Same as parse_input but the points are an (N, 2) int32 array of x, y
+    and the fold lines are ints
+    """
+    if not isinstance(input_data, str):
+        input_data = "".join(line if line.endswith("\n") else line + "\n" for line in input_data)
+    points = numpy.array(re.findall(r'^(\d+),(\d+)', input_data, re.M), dtype=numpy.int64)
+    points = points.reshape(-1, 2).astype(numpy.int32)
+    folds = [(axis, int(line)) for axis, line in re.findall(r'([xy])=(\d+)', input_data)]
+    return points, folds
+
+
+def unique_points(points):
+    """
+    Remove duplicate points by packing each x, y into one int64 key. y is
+    masked to its low 32 bits so a negative y can't overwrite x, and is
+    sign extended again when unpacking
+    """
+    keys = numpy.unique(points[:, 0].astype(numpy.int64) << 32 | (points[:, 1].astype(numpy.int64) & 0xFFFFFFFF))
+    y_coords = (keys & 0xFFFFFFFF).astype(numpy.uint32).view(numpy.int32)
+    return numpy.stack(((keys >> 32).astype(numpy.int32), y_coords), axis=1)
+
+
+def fold_array(points, fold_instruction):
+    """
+    Fold an array of points in one go, points past the fold line are
+    reflected to 2 * fold_line - coord and points on the line are dropped
+    """
+    axis, fold_line = fold_instruction
+    column = 0 if axis == 'x' else 1
+    coords = points[:, column]
+    points = points[coords != fold_line]
+    coords = points[:, column]
+    points[:, column] = numpy.where(coords > fold_line, 2 * fold_line - coords, coords)
+    return unique_points(points)
+
+
+def perform_multiple_folds_array(points, fold_instructions):
+    for fold in fold_instructions:
+        points = fold_array(points, fold)
+    return points
+
+
+DROPPED = numpy.iinfo(numpy.int32).min
+
+
+def compile_folds(fold_instructions, x_size, y_size):
+    """
+    Reduce the folds to one lookup table per axis, from original coordinate
+    to final coordinate (DROPPED if the point lands on a fold line, as
+    folds past the middle of the paper make real coordinates negative).
+    Folds along x never move y and vice versa, so each table just applies
+    that axis' folds in order to every possible coordinate
+    """
+    lookups = {'x': numpy.arange(x_size, dtype=numpy.int32), 'y': numpy.arange(y_size, dtype=numpy.int32)}
+    for axis, fold_line in fold_instructions:
+        lookup = lookups[axis]
+        folded = lookup > fold_line
+        lookup[folded] = 2 * fold_line - lookup[folded]
+        lookup[lookup == fold_line] = DROPPED
+    return lookups['x'], lookups['y']
+
+
+def perform_compiled_folds(points, fold_instructions):
+    """
+    Apply every fold with a single gather per axis, then remove the
+    duplicates once at the end
+    """
+    x_lookup, y_lookup = compile_folds(fold_instructions, *(points.max(axis=0) + 1))
+    folded = numpy.stack((x_lookup[points[:, 0]], y_lookup[points[:, 1]]), axis=1)
+    return unique_points(folded[(folded != DROPPED).all(axis=1)])
+
+
+LETTER_GLYPHS = {
+    'A': ".##.#..##..######..##..#",
+    'B': "###.#..####.#..##..####.",
+    'C': ".##.#..##...#...#..#.##.",
+    'E': "#####...###.#...#...####",
+    'F': "#####...###.#...#...#...",
+    'G': ".##.#..##...#.###..#.###",
+    'H': "#..##..######..##..##..#",
+    'I': ".###..#...#...#...#..###",
+    'J': "..##...#...#...##..#.##.",
+    'K': "#..##.#.##..#.#.#.#.#..#",
+    'L': "#...#...#...#...#...####",
+    'O': ".##.#..##..##..##..#.##.",
+    'P': "###.#..##..####.#...#...",
+    'R': "###.#..##..####.#.#.#..#",
+    'S': ".####...#....##....####.",
+    'U': "#..##..##..##..##..#.##.",
+    'Z': "####...#..#..#..#...####",
+}
+GLYPH_MASKS = {int(glyph.replace('#', '1').replace('.', '0'), 2): letter for letter, glyph in LETTER_GLYPHS.items()}
+
+
+def rasterize_points(points):
+    """
+    Pack the points into a bitmap sized from their bounds, one row of bits
+    per y. Returns the packed rows and the width in bits
+    """
+    width, height = points.max(axis=0) + 1
+    bitmap = numpy.zeros((height, width), dtype=bool)
+    bitmap[points[:, 1], points[:, 0]] = True
+    return numpy.packbits(bitmap, axis=1), width
+
+
+def read_letters(points):
+    """
+    Read the code from the folded points. The capital letters are 4 x 6
+    glyphs 5 columns apart; each letter cell becomes a 24 bit mask that is
+    looked up in GLYPH_MASKS (? for anything unrecognised)
+    """
+    packed, width = rasterize_points(points)
+    bitmap = numpy.unpackbits(packed, axis=1, count=width)[:6]
+    no_of_letters = -(-width // 5)
+    bitmap = numpy.pad(bitmap, ((0, 6 - len(bitmap)), (0, no_of_letters * 5 - width)))
+    cells = bitmap.reshape(6, no_of_letters, 5)[:, :, :4].transpose(1, 0, 2).reshape(no_of_letters, 24)
+    masks = cells.astype(numpy.int64) @ (1 << numpy.arange(23, -1, -1, dtype=numpy.int64))
+    return "".join(GLYPH_MASKS.get(int(mask), '?') for mask in masks)
+
+
 class TestGenerateGrid(unittest.TestCase):
     
     @classmethod
@@ -335,6 +458,110 @@ class TestGenerateGrid(unittest.TestCase):
             self.assertEqual(actual, expected_result)
 
 
+class TestFoldArray(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.test_input = [
+            "6,10", "0,14", "9,10", "0,3", "10,4", "4,11", "6,0",
+            "6,12", "4,1", "0,13", "10,12", "3,4", "3,0", "8,4",
+            "1,10", "2,14", "8,10", "9,0", "", "fold along y=7",
+            "fold along x=5"
+        ]
+
+    def test_parse_input_array(self):
+        points, folds = parse_input_array(self.test_input)
+        self.assertEqual(points.dtype, numpy.int32)
+        self.assertEqual(points.shape, (18, 2))
+        self.assertEqual(points[:2].tolist(), [[6, 10], [0, 14]])
+        self.assertEqual(folds, [('y', 7), ('x', 5)])
+
+    def test_fold_array(self):
+        points, folds = parse_input_array(self.test_input)
+        self.assertEqual(len(fold_array(points, folds[0])), 17)
+        self.assertEqual(len(perform_multiple_folds_array(points, folds)), 16)
+
+    def test_matches_set_folds(self):
+        fold_data = read_txt_file_contents("13-fold_instructions.txt")
+        points, folds = parse_input(fold_data)
+        array_points, array_folds = parse_input_array(fold_data)
+        for no_of_folds in [1, 2, len(folds)]:
+            with self.subTest(f"folds - {no_of_folds}"):
+                expected = {(int(x), int(y)) for x, y in perform_multiple_folds(points, folds[:no_of_folds])}
+                actual = perform_multiple_folds_array(array_points, array_folds[:no_of_folds])
+                self.assertEqual({tuple(point) for point in actual.tolist()}, expected)
+                self.assertEqual(len(actual), len(expected))
+
+    def test_unique_points_negative(self):
+        self.assertEqual(unique_points(numpy.array([[1, -1], [2, 3], [1, -1], [-4, -2]])).tolist(),
+                         [[-4, -2], [1, -1], [2, 3]])
+
+    def test_fold_past_centre(self):
+        test_input = ["0,0", "0,9", "1,10", "2,3", "4,4", "", "fold along y=4", "fold along x=1"]
+        points, folds = parse_input(test_input)
+        expected = {(int(x), int(y)) for x, y in perform_multiple_folds(points, folds)}
+        self.assertTrue(any(y < 0 for x, y in expected))
+        actual = perform_multiple_folds_array(*parse_input_array(test_input))
+        self.assertEqual({tuple(point) for point in actual.tolist()}, expected)
+        self.assertEqual(len(actual), len(expected))
+
+
+class TestCompiledFolds(unittest.TestCase):
+
+    def test_compile_folds(self):
+        x_lookup, y_lookup = compile_folds([('y', 7), ('x', 5), ('x', 2)], 11, 15)
+        self.assertEqual(x_lookup.tolist(), [0, 1, DROPPED, 1, 0, DROPPED, 0, 1, DROPPED, 1, 0])
+        self.assertEqual(y_lookup.tolist(), [0, 1, 2, 3, 4, 5, 6, DROPPED, 6, 5, 4, 3, 2, 1, 0])
+        x_lookup, y_lookup = compile_folds([('x', 4)], 11, 3)
+        self.assertEqual(x_lookup.tolist(), [0, 1, 2, 3, DROPPED, 3, 2, 1, 0, -1, -2])
+
+    def test_folds_past_centre(self):
+        for test_input in [
+            ["0,0", "9,0", "10,1", "3,2", "", "fold along x=4"],
+            ["0,0", "0,9", "1,10", "2,3", "4,4", "", "fold along y=4", "fold along x=1"],
+        ]:
+            with self.subTest(f"test input - {test_input}"):
+                expected = {(int(x), int(y)) for x, y in perform_multiple_folds(*parse_input(test_input))}
+                points, folds = parse_input_array(test_input)
+                actual = perform_compiled_folds(points, folds)
+                self.assertEqual({tuple(point) for point in actual.tolist()}, expected)
+                self.assertEqual(len(actual), len(expected))
+
+    def test_matches_fold_array(self):
+        fold_data = read_txt_file_contents("13-fold_instructions.txt")
+        points, folds = parse_input_array(fold_data)
+        for no_of_folds in [1, 2, 5, len(folds)]:
+            with self.subTest(f"folds - {no_of_folds}"):
+                expected = perform_multiple_folds_array(points, folds[:no_of_folds])
+                actual = perform_compiled_folds(points, folds[:no_of_folds])
+                self.assertEqual(actual.tolist(), expected.tolist())
+
+
+class TestReadLetters(unittest.TestCase):
+
+    def test_rasterize_points(self):
+        packed, width = rasterize_points(numpy.array([[0, 0], [9, 1], [3, 2]]))
+        self.assertEqual(width, 10)
+        self.assertEqual(packed.tolist(), [[128, 0], [0, 64], [16, 0]])
+
+    def test_read_letters(self):
+        for letter, glyph in LETTER_GLYPHS.items():
+            with self.subTest(f"letter - {letter}"):
+                code = letter + 'H'
+                points = numpy.array([
+                    [cell * 5 + i % 4, i // 4]
+                    for cell, code_letter in enumerate(code)
+                    for i, char in enumerate(LETTER_GLYPHS[code_letter]) if char == '#'
+                ])
+                self.assertEqual(read_letters(points), code)
+        self.assertEqual(read_letters(numpy.array([[0, 0], [3, 5]])), '?')
+
+    def test_puzzle_input(self):
+        fold_data = read_txt_file_contents("13-fold_instructions.txt")
+        points, folds = parse_input_array(fold_data)
+        self.assertEqual(read_letters(perform_compiled_folds(points, folds)), "HECRZKPR")
+
+
 if __name__ == "__main__":
     fold_data = read_txt_file_contents("13-fold_instructions.txt")
     points, folds = parse_input(fold_data)
@@ -342,5 +569,6 @@ if __name__ == "__main__":
     print(len(perform_single_fold(points, first_fold)))
     final_grid = perform_multiple_folds(points, folds)
     print_grid(final_grid)
+    print(read_letters(perform_compiled_folds(*parse_input_array(fold_data))))
 
     unittest.main()
\ No newline at end of file
@@ -79,7 +79,10 @@ common element?
 """
 import re
 import unittest
-from collections import Counter, defaultdict
+import numpy
+from bisect import bisect_right
+from itertools import accumulate, islice
+from collections import Counter, OrderedDict, defaultdict
 from helper_functions import read_txt_file_contents
 
 class Polymer:
@@ -289,6 +292,287 @@ class PolymerVersion2:
         letter_counts = self.letter_count.values()
         return max(letter_counts) - min(letter_counts)
 
+class PolymerMatrix:
+    """
+    Pair counting with the pairs interned to dense integer ids.
+    Every pair id has a left and right child id (a pair with no rule is its
+    own only child, right_child -1), which gives the sparse transition
+    matrix: one step is counts[left_child] += counts and
+    counts[right_child] += counts, and any number of steps is the matrix
+    power applied to the starting counts, found by exponentiation by
+    squaring
+    """
+
+    def __init__(self, input_data):
+        self.polymer, self.rules = Polymer.parse_input(input_data)
+        self.pairs = []
+        self.pair_ids = {}
+        for pair in list(zip(self.polymer, self.polymer[1:])) + list(self.rules):
+            self.intern_pair(pair)
+        self.left_child = []
+        self.right_child = []
+        i = 0
+        while i < len(self.pairs):
+            first, second = self.pairs[i]
+            if (first, second) in self.rules:
+                middle = self.rules[(first, second)]
+                self.left_child.append(self.intern_pair((first, middle)))
+                self.right_child.append(self.intern_pair((middle, second)))
+            else:
+                self.left_child.append(i)
+                self.right_child.append(-1)
+            i += 1
+        self.left_child = numpy.array(self.left_child)
+        self.right_child = numpy.array(self.right_child)
+        self.letters = sorted({letter for pair in self.pairs for letter in pair})
+        self.first_letter = numpy.array([self.letters.index(pair[0]) for pair in self.pairs])
+
+    def intern_pair(self, pair):
+        if pair not in self.pair_ids:
+            self.pair_ids[pair] = len(self.pairs)
+            self.pairs.append(pair)
+        return self.pair_ids[pair]
+
+    @property
+    def no_of_pairs(self):
+        return len(self.pairs)
+
+    def initial_pair_counts(self, dtype=numpy.int64):
+        counts = numpy.zeros(self.no_of_pairs, dtype=dtype)
+        for pair in zip(self.polymer, self.polymer[1:]):
+            counts[self.pair_ids[pair]] += 1
+        return counts
+
+    def transition_matrix(self, dtype=numpy.int64):
+        """
+        matrix[child, parent] is how many of child one parent pair makes
+        """
+        matrix = numpy.zeros((self.no_of_pairs, self.no_of_pairs), dtype=dtype)
+        parents = numpy.arange(self.no_of_pairs)
+        numpy.add.at(matrix, (self.left_child, parents), 1)
+        has_right = self.right_child >= 0
+        numpy.add.at(matrix, (self.right_child[has_right], parents[has_right]), 1)
+        return matrix
+
+    def polymerize_steps(self, steps, dtype=numpy.int64):
+        """
+        Pair counts after stepping one step at a time. int64 overflows after
+        about 60 steps, use dtype=object for exact big ints past that
+        """
+        counts = self.initial_pair_counts(dtype)
+        has_right = self.right_child >= 0
+        for _ in range(steps):
+            new_counts = numpy.zeros(self.no_of_pairs, dtype=dtype)
+            numpy.add.at(new_counts, self.left_child, counts)
+            numpy.add.at(new_counts, self.right_child[has_right], counts[has_right])
+            counts = new_counts
+        return counts
+
+    def pair_counts_after(self, steps, modulus=None):
+        """
+        Pair counts after any number of steps with O(log steps) matrix
+        products. Exact big ints (object dtype) unless a modulus is given,
+        then the counts are modulo it, in int64 when that can't overflow
+        """
+        if modulus is not None and self.no_of_pairs * (modulus - 1) ** 2 < 2 ** 63:
+            dtype = numpy.int64
+        else:
+            dtype = object
+        result = self.initial_pair_counts(dtype)
+        power = self.transition_matrix(dtype)
+        while steps:
+            if steps & 1:
+                result = power @ result
+                result = result % modulus if modulus else result
+            steps >>= 1
+            if steps:
+                power = power @ power
+                power = power % modulus if modulus else power
+        return result
+
+    def letter_count(self, pair_counts, modulus=None):
+        """
+        Every letter is the first letter of a pair apart from the last letter
+        of the polymer
+        """
+        letter_counts = {letter: 0 for letter in self.letters}
+        for pair_id, amount in enumerate(pair_counts.tolist()):
+            letter_counts[self.letters[self.first_letter[pair_id]]] += amount
+        letter_counts[self.polymer[-1]] += 1
+        if modulus:
+            letter_counts = {letter: count % modulus for letter, count in letter_counts.items()}
+        return {letter: count for letter, count in letter_counts.items() if count}
+
+    def max_minus_min(self, steps):
+        letter_counts = self.letter_count(self.pair_counts_after(steps)).values()
+        return max(letter_counts) - min(letter_counts)
+
+
+class PairCountEngine:
+    """
+    Letter counts from the recursion on (pair, steps): the letters a pair
+    inserts between its two letters after n steps are those its left and
+    right child pairs insert after n - 1 steps, plus the inserted letter.
+    The table is filled a whole step level at a time, level n from level
+    n - 1, as a read only (pairs, letters) count array. The last maxsize
+    levels used are kept (None for no eviction), so any number of templates
+    using the same rules share them, and an evicted level is rebuilt from
+    the nearest kept level below it. Pass dtype=object once the counts
+    outgrow int64
+    """
+
+    def __init__(self, rules, maxsize=None, dtype=numpy.int64):
+        self.rules = rules
+        self.dtype = dtype
+        self.maxsize = maxsize
+        self.letters = sorted({letter for pair, middle in rules.items() for letter in (*pair, middle)})
+        self.letter_ids = {letter: i for i, letter in enumerate(self.letters)}
+        self.pairs = [(first, second) for first in self.letters for second in self.letters]
+        self.pair_ids = {pair: i for i, pair in enumerate(self.pairs)}
+        # The extra last row is a pair with no rule, it never inserts anything
+        no_rule = len(self.pairs)
+        self.left_child = numpy.full(no_rule + 1, no_rule)
+        self.right_child = numpy.full(no_rule + 1, no_rule)
+        self.inserted_letter = numpy.zeros((no_rule + 1, len(self.letters)), dtype=dtype)
+        for (first, second), middle in rules.items():
+            pair_id = self.pair_ids[first, second]
+            self.left_child[pair_id] = self.pair_ids[first, middle]
+            self.right_child[pair_id] = self.pair_ids[middle, second]
+            self.inserted_letter[pair_id, self.letter_ids[middle]] = 1
+        self.base_level = numpy.zeros_like(self.inserted_letter)
+        self.base_level.flags.writeable = False
+        self.levels = OrderedDict()
+        self.levels_built = 0
+
+    def pair_id(self, pair):
+        return self.pair_ids[pair]
+
+    def level(self, steps):
+        if steps == 0:
+            return self.base_level
+        if steps in self.levels:
+            self.levels.move_to_end(steps)
+            return self.levels[steps]
+        start = max((n for n in self.levels if n < steps), default=0)
+        counts = self.levels[start] if start else self.base_level
+        for n in range(start + 1, steps + 1):
+            counts = counts[self.left_child] + counts[self.right_child] + self.inserted_letter
+            counts.flags.writeable = False
+            self.levels_built += 1
+            self.levels[n] = counts
+            if self.maxsize is not None:
+                while len(self.levels) > self.maxsize:
+                    self.levels.popitem(last=False)
+        return counts
+
+    def inserted_counts(self, pair_id, steps):
+        return self.level(steps)[pair_id]
+
+    def letter_counts(self, template, steps):
+        counts = numpy.zeros(len(self.letters), dtype=self.dtype)
+        for letter in template:
+            counts[self.letter_ids[letter]] += 1
+        level = self.level(steps)
+        for pair in zip(template, template[1:]):
+            counts += level[self.pair_id(pair)]
+        return counts
+
+    def max_minus_min(self, template, steps):
+        counts = self.letter_counts(template, steps)
+        counts = counts[counts > 0]
+        return counts.max() - counts.min()
+
+
+class PolymerStream:
+    """
+    The polymer after a number of steps without ever building the string.
+    Each pair of the template is expanded depth first, so the stack only
+    holds O(steps) items. inner_lengths[n][pair] is the number of letters a
+    pair inserts between its own letters after n steps, which lets
+    characters(start) skip straight to any position, so char_at and window
+    can read from a polymer far too long to store
+    """
+
+    def __init__(self, input_data, steps):
+        self.polymer, self.rules = Polymer.parse_input(input_data)
+        self.steps = steps
+        self.inner_lengths = [{pair: 0 for pair in self.rules}]
+        for _ in range(steps):
+            previous = self.inner_lengths[-1]
+            self.inner_lengths.append({
+                (first, second): previous.get((first, middle), 0) + 1 + previous.get((middle, second), 0)
+                for (first, second), middle in self.rules.items()
+            })
+        self.template_pairs = list(zip(self.polymer, self.polymer[1:]))
+        block_lengths = [1 + self.inner_lengths[steps].get(pair, 0) for pair in self.template_pairs]
+        self.block_starts = [0] + list(accumulate(block_lengths))
+
+    @property
+    def length(self):
+        return self.block_starts[-1] + 1
+
+    def __iter__(self):
+        return self.characters()
+
+    def push_expansion(self, stack, pair, steps):
+        """
+        Push the letters inserted between pair after steps, leftmost on top
+        """
+        if steps and pair in self.rules:
+            first, second = pair
+            middle = self.rules[pair]
+            stack.append(((middle, second), steps - 1))
+            stack.append(middle)
+            stack.append(((first, middle), steps - 1))
+
+    def seek_expansion(self, stack, pair, steps, offset):
+        """
+        Push the letters inserted between pair after steps, starting from
+        offset, by walking down the expansion using the subtree lengths
+        """
+        while True:
+            first, second = pair
+            middle = self.rules[pair]
+            left_length = self.inner_lengths[steps - 1].get((first, middle), 0)
+            if offset > left_length:
+                pair, steps, offset = (middle, second), steps - 1, offset - left_length - 1
+                continue
+            stack.append(((middle, second), steps - 1))
+            stack.append(middle)
+            if offset == left_length:
+                return
+            pair, steps = (first, middle), steps - 1
+
+    def characters(self, start=0):
+        if not 0 <= start < self.length:
+            return
+        block = bisect_right(self.block_starts, start) - 1
+        for pair_index in range(block, len(self.template_pairs)):
+            pair = self.template_pairs[pair_index]
+            offset = start - self.block_starts[pair_index] if pair_index == block else 0
+            stack = []
+            if offset == 0:
+                yield pair[0]
+                self.push_expansion(stack, pair, self.steps)
+            else:
+                self.seek_expansion(stack, pair, self.steps, offset - 1)
+            while stack:
+                item = stack.pop()
+                if isinstance(item, str):
+                    yield item
+                else:
+                    self.push_expansion(stack, *item)
+        yield self.polymer[-1]
+
+    def char_at(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError("polymer index out of range")
+        return next(self.characters(index))
+
+    def window(self, start, stop):
+        return "".join(islice(self.characters(start), max(stop - start, 0)))
+
+
 class TestPolymerVersion2(unittest.TestCase):
 
     @classmethod
@@ -492,6 +776,146 @@ class TestPolymerVersion2(unittest.TestCase):
                 self.assertEqual(actual, expected_result)
 
 
+class TestPolymerMatrix(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.polymer_instructions = [
+            'NNCB', 'CH -> B', 'HH -> N', 'CB -> H', 'NH -> C',
+            'HB -> C', 'HC -> B', 'HN -> C', 'NN -> C', 'BH -> H',
+            'NC -> B', 'NB -> B', 'BN -> B', 'BB -> N', 'BC -> B',
+            'CC -> N', 'CN -> C'
+        ]
+
+    def test_max_minus_min(self):
+        poly = PolymerMatrix(self.polymer_instructions)
+        self.assertEqual(poly.no_of_pairs, 16)
+        for steps, expected_result in [(0, 1), (4, 18), (10, 1588), (40, 2188189693529)]:
+            with self.subTest(f"steps - {steps}"):
+                self.assertEqual(poly.max_minus_min(steps), expected_result)
+
+    def test_matches_polymer_version_2(self):
+        polymer_data = read_txt_file_contents('14-polymer_map.txt')
+        poly = PolymerMatrix(polymer_data)
+        for steps in [0, 1, 10, 40]:
+            with self.subTest(f"steps - {steps}"):
+                poly2 = PolymerVersion2(polymer_data)
+                poly2.polymerize(steps)
+                self.assertEqual(poly.letter_count(poly.pair_counts_after(steps)), poly2.letter_count)
+                self.assertEqual(poly.letter_count(poly.polymerize_steps(steps)), poly2.letter_count)
+
+    def test_modular_counts(self):
+        poly = PolymerMatrix(self.polymer_instructions)
+        exact_counts = poly.pair_counts_after(150)
+        self.assertEqual(poly.polymerize_steps(150, dtype=object).tolist(), exact_counts.tolist())
+        for modulus in [10 ** 9 + 7, 2 ** 61 - 1]:
+            with self.subTest(f"modulus - {modulus}"):
+                actual = poly.pair_counts_after(150, modulus)
+                self.assertEqual(actual.tolist(), [count % modulus for count in exact_counts.tolist()])
+        self.assertEqual(poly.letter_count(poly.pair_counts_after(10, 1000), 1000),
+                         {'B': 749, 'C': 298, 'H': 161, 'N': 865})
+
+    def test_pair_without_rule(self):
+        poly = PolymerMatrix(['ABA', 'AB -> A'])
+        self.assertEqual(poly.letter_count(poly.pair_counts_after(3)), {'A': 5, 'B': 1})
+        self.assertEqual(poly.letter_count(poly.polymerize_steps(3)), {'A': 5, 'B': 1})
+
+
+class TestPairCountEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.polymer_data = read_txt_file_contents('14-polymer_map.txt')
+        cls.template, cls.rules = Polymer.parse_input(cls.polymer_data)
+
+    def test_letter_counts(self):
+        template, rules = Polymer.parse_input(['NNCB', 'CH -> B', 'HH -> N', 'CB -> H', 'NH -> C',
+                                               'HB -> C', 'HC -> B', 'HN -> C', 'NN -> C', 'BH -> H',
+                                               'NC -> B', 'NB -> B', 'BN -> B', 'BB -> N', 'BC -> B',
+                                               'CC -> N', 'CN -> C'])
+        engine = PairCountEngine(rules)
+        self.assertEqual(engine.letter_counts(template, 4).tolist(), [23, 10, 5, 11])
+        self.assertEqual(engine.max_minus_min(template, 10), 1588)
+        self.assertEqual(engine.max_minus_min(template, 40), 2188189693529)
+
+    def test_matches_polymer_version_2(self):
+        engine = PairCountEngine(self.rules)
+        for steps in [0, 1, 10, 40]:
+            with self.subTest(f"steps - {steps}"):
+                poly2 = PolymerVersion2(self.polymer_data)
+                poly2.polymerize(steps)
+                counts = engine.letter_counts(self.template, steps)
+                actual = {letter: count for letter, count in zip(engine.letters, counts.tolist()) if count}
+                self.assertEqual(actual, poly2.letter_count)
+                self.assertEqual(engine.max_minus_min(self.template, steps), poly2.max_minus_min)
+
+    def test_shared_levels(self):
+        engine = PairCountEngine(self.rules)
+        engine.max_minus_min(self.template, 40)
+        self.assertEqual(engine.levels_built, 40)
+        other_template = self.template[::-1]
+        poly2 = PolymerVersion2([''.join(other_template)] + self.polymer_data[1:])
+        poly2.polymerize(40)
+        self.assertEqual(engine.max_minus_min(other_template, 40), poly2.max_minus_min)
+        engine.max_minus_min(self.template, 10)
+        self.assertEqual(engine.levels_built, 40)
+
+    def test_eviction_and_big_ints(self):
+        limited_engine = PairCountEngine(self.rules, maxsize=2)
+        self.assertEqual(limited_engine.max_minus_min(self.template, 20),
+                         PairCountEngine(self.rules).max_minus_min(self.template, 20))
+        self.assertEqual(list(limited_engine.levels), [19, 20])
+        self.assertEqual(limited_engine.max_minus_min(self.template, 10),
+                         PairCountEngine(self.rules).max_minus_min(self.template, 10))
+        self.assertEqual(limited_engine.levels_built, 30)
+        exact_engine = PairCountEngine(self.rules, dtype=object)
+        poly = PolymerMatrix(self.polymer_data)
+        expected = poly.letter_count(poly.pair_counts_after(100))
+        counts = exact_engine.letter_counts(self.template, 100)
+        self.assertEqual(dict(zip(exact_engine.letters, counts.tolist())), expected)
+        counts = exact_engine.letter_counts(self.template, 1000)
+        self.assertEqual(sum(counts.tolist()), len(self.template) + (len(self.template) - 1) * (2 ** 1000 - 1))
+
+
+class TestPolymerStream(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.polymer_instructions = [
+            'NNCB', 'CH -> B', 'HH -> N', 'CB -> H', 'NH -> C',
+            'HB -> C', 'HC -> B', 'HN -> C', 'NN -> C', 'BH -> H',
+            'NC -> B', 'NB -> B', 'BN -> B', 'BB -> N', 'BC -> B',
+            'CC -> N', 'CN -> C'
+        ]
+
+    def test_matches_polymer(self):
+        for steps in [0, 1, 4, 10]:
+            with self.subTest(f"steps - {steps}"):
+                expected = Polymer(self.polymer_instructions).polymerize(steps) if steps else "NNCB"
+                stream = PolymerStream(self.polymer_instructions, steps)
+                self.assertEqual(stream.length, len(expected))
+                self.assertEqual("".join(stream), expected)
+                for index in [0, 1, 2, len(expected) // 3, len(expected) - 2, len(expected) - 1]:
+                    self.assertEqual(stream.char_at(index), expected[index])
+                    self.assertEqual(stream.window(index, index + 7), expected[index: index + 7])
+
+    def test_every_start(self):
+        expected = Polymer(self.polymer_instructions).polymerize(5)
+        stream = PolymerStream(self.polymer_instructions, 5)
+        for start in range(len(expected)):
+            self.assertEqual("".join(stream.characters(start)), expected[start:])
+
+    def test_huge_polymer(self):
+        stream = PolymerStream(self.polymer_instructions, 40)
+        poly2 = PolymerVersion2(self.polymer_instructions)
+        poly2.polymerize(40)
+        self.assertEqual(stream.length, sum(poly2.letter_count.values()))
+        self.assertEqual(stream.char_at(stream.length - 1), 'B')
+        self.assertEqual(len(stream.window(10 ** 12, 10 ** 12 + 50)), 50)
+        with self.assertRaises(IndexError):
+            stream.char_at(stream.length)
+
+
 if __name__ == '__main__':
     polymer_data = read_txt_file_contents('14-polymer_map.txt')
     poly = Polymer(polymer_data)
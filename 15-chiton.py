@@ -49,6 +49,8 @@ What is the lowest total risk of any path from the top left to the bottom right?
 """
 
 import unittest
+import numpy
+from array import array
 from collections import defaultdict
 from queue import PriorityQueue
 from helper_functions import read_txt_file_contents
@@ -102,6 +104,70 @@ def min_chiton_risk(risk_map, tiled=False):
     return costs[depth - 1, width - 1]
 
 
+def flat_risk_grid(risk_map, tiled=False):
+    """
+    Flatten the risk map into a row major byte array, so node (i, j) is
+    index i * width + j. The 5x tiling is done in numpy rather than through
+    increment_array
+    """
+    if isinstance(risk_map[0], str):
+        risk_map = parse_input(risk_map)
+    grid = numpy.array(risk_map, dtype=numpy.uint8)
+    if tiled:
+        depth, width = grid.shape
+        tile_offsets = numpy.add.outer(numpy.arange(5), numpy.arange(5)).astype(numpy.uint8)
+        grid = (numpy.tile(grid, (5, 5)) + numpy.repeat(numpy.repeat(tile_offsets, depth, axis=0), width, axis=1) - 1) % 9 + 1
+    depth, width = grid.shape
+    return array('B', grid.tobytes()), depth, width
+
+
+def min_chiton_risk_buckets(risk_map, tiled=False):
+    """
+    Dijkstra over a flat array of risks. Costs are kept in a preallocated
+    array indexed by i * width + j and the four neighbours are found with
+    inline offsets. As every risk is 1 to 9 the priority queue is a bucket
+    queue (Dial's algorithm): a ring of 10 lists of node ids indexed by
+    cost % 10, since no queued cost is ever more than 9 above the current one
+    """
+    if not risk_map or not risk_map[0]:
+        return 0
+    risks, depth, width = flat_risk_grid(risk_map, tiled)
+    size = depth * width
+    target = size - 1
+    unvisited = size * 9 + 1
+    costs = array('q', [unvisited]) * size
+    costs[0] = 0
+    buckets = [[] for _ in range(10)]
+    buckets[0].append(0)
+    queued = 1
+    cost = 0
+    while queued:
+        bucket = buckets[cost % 10]
+        while bucket:
+            node = bucket.pop()
+            queued -= 1
+            if cost > costs[node]:
+                continue
+            if node == target:
+                return cost
+            column = node % width
+            for neighbour in (
+                node - width if node >= width else -1,
+                node + width if node + width < size else -1,
+                node - 1 if column else -1,
+                node + 1 if column + 1 < width else -1,
+            ):
+                if neighbour < 0:
+                    continue
+                potential_cost = cost + risks[neighbour]
+                if potential_cost < costs[neighbour]:
+                    costs[neighbour] = potential_cost
+                    buckets[potential_cost % 10].append(neighbour)
+                    queued += 1
+        cost += 1
+    return costs[target]
+
+
 def parse_input(risk_map):
     risk_map = [[int(num) for num in row if num.isdigit()] for row in risk_map ]
     return risk_map
@@ -265,6 +331,18 @@ class TestChiton(unittest.TestCase):
             actual = min_chiton_risk(test_case, True)
             self.assertEqual(actual, expected_result)
 
+    def test_chiton_buckets(self):
+        for test_case, expected_result in self.test_cases:
+            with self.subTest(f"Test Case: {test_case}"):
+                self.assertEqual(min_chiton_risk_buckets(test_case), expected_result)
+        for test_case, expected_result in self.tiled_test_cases:
+            self.assertEqual(min_chiton_risk_buckets(test_case, True), expected_result)
+
+    def test_flat_risk_grid(self):
+        risks, depth, width = flat_risk_grid(self.tiled_test_cases[0][0], True)
+        self.assertEqual((depth, width), (50, 50))
+        self.assertEqual(list(risks), [risk for row in increment_array(parse_input(self.tiled_test_cases[0][0])) for risk in row])
+
 
 class TestIncrementArray(unittest.TestCase):
 
@@ -521,7 +599,7 @@ left to the bottom right?
 
 if __name__ == "__main__":
     cave_map = read_txt_file_contents("15-cave_map.txt")
-    print(min_chiton_risk(cave_map))
-    print(min_chiton_risk(cave_map, tiled=True))
+    print(min_chiton_risk_buckets(cave_map))
+    print(min_chiton_risk_buckets(cave_map, tiled=True))
 
     unittest.main()